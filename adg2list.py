@@ -1,4 +1,5 @@
 import argparse
+import itertools
 import re
 import sys
 
@@ -77,11 +78,144 @@ def parse_hosts(stream):
     return list(seen.keys())
 
 
+# AdGuard/ABP modifiers that still mean "block the whole domain" at DNS level
+DOMAIN_WIDE_MODIFIERS = {"important", "all", "document", "doc", "popup"}
+# Markers of cosmetic / scriptlet / HTML filtering rules (not domain blocks)
+COSMETIC_MARKERS = ("##", "#@#", "#?#", "#@?#", "#$#", "#@$#", "#%#", "#@%#", "$$", "$@$")
+
+
+def parse_adguard_rule(line: str):
+    """
+    Parse a single AdGuard/ABP rule.
+
+    Returns a (domain, is_exception) tuple for rules that block (or unblock)
+    a whole domain, or None for comments, cosmetic rules and rules that only
+    match specific URLs / request types.
+    """
+    rule = line.strip()
+    if not rule or rule[0] in "!#[":
+        return None
+    if any(marker in rule for marker in COSMETIC_MARKERS):
+        return None
+
+    is_exception = rule.startswith("@@")
+    if is_exception:
+        rule = rule[2:]
+
+    # split off $modifiers; rules restricted to some request types do not
+    # block the domain itself
+    if "$" in rule:
+        rule, _, options = rule.partition("$")
+        modifiers = {opt.strip().lower() for opt in options.split(",") if opt.strip()}
+        if not modifiers <= DOMAIN_WIDE_MODIFIERS:
+            return None
+
+    if rule.startswith("||"):
+        rule = rule[2:]
+    elif rule.startswith("|"):
+        rule = rule[1:]
+        for scheme in ("http://", "https://"):
+            if rule.startswith(scheme):
+                rule = rule[len(scheme):]
+                break
+    elif rule.startswith("://"):
+        rule = rule[3:]
+
+    if rule.endswith("|"):
+        rule = rule[:-1]
+    if rule.endswith("^"):
+        rule = rule[:-1]
+    elif "^" in rule or "/" in rule:
+        # anything after the separator is a path / query match
+        return None
+    if rule.startswith("*."):
+        rule = rule[2:]
+
+    rule = rule.lower()
+    if not DOMAIN_RE.match(rule) or rule in SKIP_NAMES:
+        return None
+    return rule, is_exception
+
+
+def _is_excepted(domain: str, exceptions) -> bool:
+    # an exception for a domain also covers all of its subdomains
+    labels = domain.split(".")
+    for i in range(len(labels) - 1):
+        if ".".join(labels[i:]) in exceptions:
+            return True
+    return False
+
+
+def iter_adguard_domains(stream):
+    """
+    Stream blocking domains out of an AdGuard/ABP filter list.
+
+    Input is read line by line; blocking domains are kept in insertion order
+    and `@@` exceptions are subtracted once the whole list has been seen,
+    since exceptions may appear after the rules they override. Plain
+    hosts-file lines mixed into the list are understood as well.
+    """
+    blocked = {}
+    exceptions = set()
+    for raw in stream:
+        parsed = parse_adguard_rule(raw)
+        if parsed is None:
+            # hosts-style lines ("0.0.0.0 example.com") are common in
+            # combined lists; comments and "[Adblock Plus]" headers are not
+            line = raw.strip()
+            parts = line.split()
+            if (
+                len(parts) > 1
+                and line[0] not in "!#["
+                and IP_RE.match(parts[0])
+                and any(c in parts[0] for c in ".:")
+                and not any(m in line for m in COSMETIC_MARKERS)
+            ):
+                for domain in parse_hosts([line]):
+                    blocked.setdefault(domain, None)
+            continue
+        domain, is_exception = parsed
+        if is_exception:
+            exceptions.add(domain)
+        else:
+            blocked.setdefault(domain, None)
+
+    for domain in blocked:
+        if not exceptions or not _is_excepted(domain, exceptions):
+            yield domain
+
+
+def detect_format(first_lines) -> str:
+    """Guess whether a list is hosts-file or AdGuard/ABP syntax."""
+    for line in first_lines:
+        line = line.strip()
+        if line.startswith(("[Adblock", "[AdGuard", "||", "@@", "!")):
+            return "adguard"
+    return "hosts"
+
+
+def iter_domains(stream, fmt: str = "auto"):
+    """Yield domains from a hosts file or AdGuard/ABP filter list."""
+    if fmt == "auto":
+        head = []
+        for line in stream:
+            head.append(line)
+            if len(head) >= 50:
+                break
+        fmt = detect_format(head)
+        stream = itertools.chain(head, stream)
+    if fmt == "adguard":
+        yield from iter_adguard_domains(stream)
+    else:
+        yield from parse_hosts(stream)
+
+
 def main():
-    p = argparse.ArgumentParser(description="Convert hosts file to simple domain list")
-    p.add_argument('-i', '--input', help='input hosts file (default: stdin)', default='-')
+    p = argparse.ArgumentParser(description="Convert hosts file or AdGuard/ABP filter list to simple domain list")
+    p.add_argument('-i', '--input', help='input hosts file or filter list (default: stdin)', default='-')
     p.add_argument('-o', '--output', help='output file (default: stdout)', default='-')
     p.add_argument('--sort', help='sort the resulting domains alphabetically', action='store_true')
+    p.add_argument('--format', help='input syntax (default: auto-detect)', choices=('auto', 'hosts', 'adguard'), default='auto')
     args = p.parse_args()
 
     if args.input == '-':
@@ -89,7 +223,7 @@ def main():
     else:
         infile = open(args.input, 'r', encoding='utf-8', errors='ignore')
 
-    domains = parse_hosts(infile)
+    domains = list(iter_domains(infile, args.format))
 
     if args.input != '-':
         infile.close()
@@ -0,0 +1,343 @@
+"""
+Reproducible benchmarks against a local stub DNS server (stubdns.py).
+
+Generates synthetic domain lists, runs main.py, the Rust binary and the
+list parsers against them, and records queries/sec, p99 latency (as seen by
+the stub, retries included), peak RSS and recall of the seeded RPZ names.
+Results are appended as JSON lines; pass --baseline to fail on regressions.
+
+    python benchmark.py --sizes 10000 100000 --latency 0.005 --loss 0.01
+"""
+
+import argparse
+import gzip
+import json
+import shutil
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from stubdns import RPZ_IP, is_nxdomain, is_rpz
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def generate_domains(path: str, count: int):
+    # ~1000 registrable domains with many subdomains each, like merged lists
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(f"host{i}.example{i % 997}.com\n")
+
+
+def iter_file(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def run_measured(cmd, cwd=None, env=None) -> dict:
+    """Run a command to completion and return wall time, peak RSS and exit code."""
+    # stderr goes to a file: a pipe nobody reads while we block in wait4()
+    # would hang both processes once the child fills it
+    with tempfile.TemporaryFile() as stderr_file:
+        start = time.monotonic()
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=stderr_file)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.monotonic() - start
+        if proc.returncode != 0:
+            stderr_file.seek(max(0, stderr_file.seek(0, os.SEEK_END) - 2000))
+            stderr = stderr_file.read().decode("utf-8", "ignore")
+            print(f"[Error] {' '.join(cmd)} exited with {proc.returncode}:\n{stderr}")
+    # ru_maxrss is in kilobytes on Linux
+    return {"wall": wall, "rss_mb": rusage.ru_maxrss / 1024, "returncode": proc.returncode}
+
+
+class StubServer:
+    def __init__(self, port, workdir, **options):
+        self.port = port
+        self.stats_file = os.path.join(workdir, f"stub-{port}.json")
+        cmd = [sys.executable, os.path.join(HERE, "stubdns.py"), "--port", str(port), "--stats", self.stats_file]
+        for key, value in options.items():
+            cmd += [f"--{key.replace('_', '-')}", str(value)]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        # wait until the socket is bound; stubdns.py prints one line once it
+        # listens and exits without it if the bind fails (e.g. port in use)
+        line = self.proc.stdout.readline()
+        if "listening" not in line:
+            self.proc.wait()
+            self.proc.stdout.close()
+            raise RuntimeError(f"stub DNS server on port {port} failed to start (exit code {self.proc.returncode})")
+
+    def stop(self) -> dict:
+        self.proc.terminate()
+        self.proc.wait()
+        self.proc.stdout.close()
+        try:
+            with open(self.stats_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+def recall(output_file: str, expected: set) -> float:
+    if not expected:
+        return 1.0
+    # first column, so differential output ("domain<TAB>reason...") works too
+    found = {line.split()[0] for line in iter_file(output_file)} if os.path.exists(output_file) else set()
+    return len(found & expected) / len(expected)
+
+
+def bench_scanner(name, cmd, env, domains_file, output_file, size, expected, args, workdir, control=False):
+    options = dict(
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+        nxdomain_rate=args.nxdomain_rate,
+        seed=args.seed,
+    )
+    stub = StubServer(args.port, workdir, rpz_rate=args.rpz_rate, **options)
+    control_stub = None
+    try:
+        if control:
+            # same seed, so the control gives identical answers except for RPZ names
+            control_stub = StubServer(args.port + 1, workdir, rpz_rate=0, **options)
+        run = run_measured(cmd, cwd=workdir, env=env)
+    finally:
+        stats = stub.stop()
+        if control_stub:
+            control_stub.stop()
+    return {
+        "target": name,
+        "size": size,
+        "wall": run["wall"],
+        "qps": size / run["wall"] if run["wall"] > 0 else 0.0,
+        "rss_mb": run["rss_mb"],
+        "latency_p99": stats.get("latency_p99", 0.0),
+        "queries": stats.get("received", 0),
+        "recall": recall(output_file, expected),
+        "ok": run["returncode"] == 0,
+    }
+
+
+def bench_parsers(domains_file, size, workdir):
+    results = []
+
+    def record(name, run, file_size=None):
+        results.append({
+            "target": name,
+            "size": size,
+            "wall": run["wall"],
+            "qps": size / run["wall"] if run["wall"] > 0 else 0.0,
+            "rss_mb": run["rss_mb"],
+            "ok": run["returncode"] == 0,
+        })
+        if file_size is not None:
+            results[-1]["file_mb"] = file_size / 2**20
+
+    adguard = os.path.join(workdir, "filter.txt")
+    csv_file = os.path.join(workdir, "ranks.csv")
+    massdns_dir = os.path.join(workdir, "massdns-text")
+    binary_dir = os.path.join(workdir, "massdns-binary")
+    os.makedirs(massdns_dir, exist_ok=True)
+    os.makedirs(binary_dir, exist_ok=True)
+    massdns = os.path.join(massdns_dir, "results.txt")
+    with open(adguard, "w") as fa, open(csv_file, "w") as fc, open(massdns, "w") as fm:
+        fa.write("! Title: synthetic\n")
+        for rank, domain in enumerate(iter_file(domains_file), 1):
+            fa.write(f"@@||{domain}^\n" if rank % 50 == 0 else f"||{domain}^\n")
+            fc.write(f"{rank},{domain}\n")
+            ip = RPZ_IP if rank % 100 == 0 else f"198.18.{rank % 256}.{rank // 256 % 256}"
+            fm.write(f"{domain}. A {ip}\n")
+            if rank % 3 == 0:
+                fm.write(f"{domain}. A 198.19.{rank % 256}.{rank // 256 % 256}\n")
+
+    python = sys.executable
+    record("adg2list", run_measured([python, os.path.join(HERE, "adg2list.py"), "-i", adguard, "-o", os.devnull]))
+    record("csv2txt", run_measured([python, os.path.join(HERE, "csv2txt.py"), "-i", csv_file, "-o", os.devnull]))
+    record("blockindex-build", run_measured(
+        [python, os.path.join(HERE, "blockindex.py"), "build", "-i", domains_file, "-o", os.path.join(workdir, "list.idx")]
+    ))
+    binary = os.path.join(binary_dir, "results.txt")
+    record(
+        "resultfile-convert",
+        run_measured([python, os.path.join(HERE, "resultfile.py"), "convert", massdns, binary]),
+        os.path.getsize(binary),
+    )
+    # the storage baseline: massdns text compressed the same way
+    massdns_gz = massdns + ".gz"
+    start = time.monotonic()
+    with open(massdns, "rb") as src, gzip.open(massdns_gz, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst)
+    record("massdns-text-gzip", {"wall": time.monotonic() - start, "rss_mb": 0.0, "returncode": 0}, os.path.getsize(massdns_gz))
+    record("resultfile-read", run_measured([python, os.path.join(HERE, "resultfile.py"), "stats", binary]))
+    # massdns2list reads ./results.txt, text or binary
+    record("massdns2list-text", run_measured([python, os.path.join(HERE, "massdns2list.py")], cwd=massdns_dir))
+    record("massdns2list-binary", run_measured([python, os.path.join(HERE, "massdns2list.py")], cwd=binary_dir))
+    return results
+
+
+def check_result_format(results, strict=False, min_size=1_000_000, margin=0.25) -> bool:
+    """
+    Compare the binary result file with massdns text on parse time and size.
+
+    The comparison is always printed. It only fails the run with `strict`,
+    and then only for sizes of at least `min_size`, where the binary path
+    must be `margin` faster; smaller runs are dominated by process startup.
+    """
+    by_name = {(r["target"], r["size"]): r for r in results}
+    ok = True
+    for (target, size), binary in by_name.items():
+        if target != "massdns2list-binary":
+            continue
+        enforce = strict and size >= min_size
+        text = by_name.get(("massdns2list-text", size))
+        if text and text["wall"] > 0:
+            speedup = text["wall"] / binary["wall"] if binary["wall"] > 0 else float("inf")
+            print(f"[Info] massdns2list @ {size}: binary {binary['wall']:.2f}s vs text {text['wall']:.2f}s ({speedup:.1f}x)")
+            if enforce and binary["wall"] > text["wall"] * (1 - margin):
+                ok = False
+                print(f"[Regression] massdns2list @ {size}: binary is not {margin:.0%} faster than text")
+        stored = by_name.get(("resultfile-convert", size), {}).get("file_mb")
+        gzipped = by_name.get(("massdns-text-gzip", size), {}).get("file_mb")
+        if stored and gzipped:
+            print(f"[Info] result file @ {size}: {stored:.2f} MB vs gzip text {gzipped:.2f} MB")
+            if enforce and stored >= gzipped:
+                ok = False
+                print(f"[Regression] result file @ {size}: not smaller than gzip text")
+    return ok
+
+
+def check_regressions(results, baseline_file, tolerance) -> bool:
+    """Compare qps with the latest baseline entry of each target/size."""
+    baseline = {}
+    with open(baseline_file) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                baseline[(entry["target"], entry["size"])] = entry
+    ok = True
+    for result in results:
+        if not result["ok"]:
+            ok = False
+            print(f"[Regression] {result['target']} @ {result['size']}: run failed")
+            continue
+        previous = baseline.get((result["target"], result["size"]))
+        if not previous or not previous.get("qps"):
+            continue
+        change = result["qps"] / previous["qps"] - 1
+        if change < -tolerance:
+            ok = False
+            print(f"[Regression] {result['target']} @ {result['size']}: {previous['qps']:.0f} -> {result['qps']:.0f} /sec ({change:+.1%})")
+        if "recall" in previous and result.get("recall", 1.0) < previous["recall"]:
+            ok = False
+            print(f"[Regression] {result['target']} @ {result['size']}: recall {previous['recall']:.3f} -> {result['recall']:.3f}")
+    return ok
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark the scanners and parsers against a local stub DNS server")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000], help="synthetic input sizes (default: 10000)")
+    p.add_argument(
+        "--targets", nargs="+", default=["python", "rust", "parsers"], choices=("python", "differential", "rust", "parsers")
+    )
+    p.add_argument("--rust-bin", default=os.path.join(HERE, "target", "release", "rpz-detector"))
+    p.add_argument("--port", type=int, default=5353, help="stub DNS port (the control stub uses port + 1)")
+    p.add_argument("--latency", type=float, default=0.005)
+    p.add_argument("--jitter", type=float, default=0.0)
+    p.add_argument("--loss", type=float, default=0.0)
+    p.add_argument("--rpz-rate", type=float, default=0.01)
+    p.add_argument("--nxdomain-rate", type=float, default=0.05)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--num-tasks", type=int, default=50, help="main.py concurrency")
+    p.add_argument("--output", default="bench-results.jsonl", help="append results here")
+    p.add_argument("--baseline", default=None, help="results file to compare against")
+    p.add_argument("--tolerance", type=float, default=0.10, help="allowed qps drop before failing (default: 0.10)")
+    p.add_argument(
+        "--check-format",
+        action="store_true",
+        help="fail unless result files parse at least 25%% faster than massdns text and are smaller than gzip text (sizes >= 1M only)",
+    )
+    args = p.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="rpz-bench-") as workdir:
+        for size in args.sizes:
+            domains_file = os.path.join(workdir, f"domains-{size}.txt")
+            generate_domains(domains_file, size)
+            # the stub answers NXDOMAIN before RPZ, those names cannot match
+            expected = {
+                d
+                for d in iter_file(domains_file)
+                if is_rpz(d, args.seed, args.rpz_rate) and not is_nxdomain(d, args.seed, args.nxdomain_rate)
+            }
+            server = f"127.0.0.1:{args.port}"
+
+            if "python" in args.targets:
+                output_file = os.path.join(workdir, "python-matches.txt")
+                cmd = [
+                    sys.executable, os.path.join(HERE, "main.py"),
+                    "-i", domains_file, "-o", output_file,
+                    "--dns-server", server,
+                    "--num-tasks", str(args.num_tasks),
+                    "--timeout", "1", "--retry-delay", "0.1",
+                ]
+                results.append(bench_scanner("main.py", cmd, None, domains_file, output_file, size, expected, args, workdir))
+
+            if "differential" in args.targets:
+                diff_file = os.path.join(workdir, "divergent.txt")
+                cmd = [
+                    sys.executable, os.path.join(HERE, "main.py"),
+                    "-i", domains_file, "-o", os.path.join(workdir, "diff-matches.txt"),
+                    "--dns-server", server,
+                    "--control-server", f"127.0.0.1:{args.port + 1}",
+                    "--diff-output", diff_file,
+                    "--num-tasks", str(args.num_tasks),
+                    "--timeout", "1", "--retry-delay", "0.1",
+                ]
+                results.append(
+                    bench_scanner("main.py-differential", cmd, None, domains_file, diff_file, size, expected, args, workdir, control=True)
+                )
+
+            if "rust" in args.targets:
+                if os.path.exists(args.rust_bin):
+                    output_file = os.path.join(workdir, "rust-matches.txt")
+                    env = dict(os.environ, RPZ_DNS_SERVERS=server)
+                    cmd = [args.rust_bin, domains_file, output_file]
+                    results.append(bench_scanner("rust", cmd, env, domains_file, output_file, size, expected, args, workdir))
+                else:
+                    print(f"[Info] {args.rust_bin} not found, run `cargo build --release` first; skipping")
+
+            if "parsers" in args.targets:
+                results.extend(bench_parsers(domains_file, size, workdir))
+
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(args.output, "a") as f:
+        for result in results:
+            result["time"] = stamp
+            f.write(json.dumps(result) + "\n")
+
+    print(f"{'target':<22}{'size':>10}{'wall s':>10}{'per sec':>12}{'p99 ms':>10}{'RSS MB':>10}{'recall':>8}{'file MB':>10}")
+    for r in results:
+        p99 = f"{r['latency_p99'] * 1000:.1f}" if "latency_p99" in r else "-"
+        rec = f"{r['recall']:.3f}" if "recall" in r else "-"
+        file_mb = f"{r['file_mb']:.2f}" if "file_mb" in r else "-"
+        flag = "" if r["ok"] else "  FAILED"
+        print(
+            f"{r['target']:<22}{r['size']:>10}{r['wall']:>10.2f}{r['qps']:>12.0f}{p99:>10}{r['rss_mb']:>10.1f}"
+            f"{rec:>8}{file_mb:>10}{flag}"
+        )
+
+    ok = check_result_format(results, strict=args.check_format)
+    if args.baseline and not check_regressions(results, args.baseline, args.tolerance):
+        ok = False
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Sorted reversed-name index for rpz-block-list.txt.
+
+Names are stored with their labels reversed ("www.example.com" ->
+"com.example.www") and sorted, so a blocked parent is a bisect per label and
+all names under a suffix form one contiguous range. The index file is
+
+    magic (8 bytes) | count (u32) | count + 1 offsets (u32) | names blob
+
+and is memory-mapped, so opening it costs nothing regardless of size.
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+
+MAGIC = b"RPZIDX1\n"
+HEADER = struct.Struct("<I")
+OFFSET = struct.Struct("<I")
+DEFAULT_LIST = "rpz-block-list.txt"
+DEFAULT_INDEX = "rpz-block-list.idx"
+
+
+def reverse_name(name: str) -> bytes:
+    return ".".join(reversed(name.strip().lower().rstrip(".").split("."))).encode("ascii", "ignore")
+
+
+def build_index(names) -> bytes:
+    """Serialize an iterable of domain names into the index format."""
+    keys = sorted({reverse_name(name) for name in names if name.strip()})
+    offsets = bytearray()
+    position = 0
+    for key in keys:
+        offsets += OFFSET.pack(position)
+        position += len(key)
+    offsets += OFFSET.pack(position)
+    return MAGIC + HEADER.pack(len(keys)) + bytes(offsets) + b"".join(keys)
+
+
+class BlockIndex:
+    def __init__(self, buffer):
+        if buffer[: len(MAGIC)] != MAGIC:
+            raise ValueError("not an rpz block list index")
+        self._buf = buffer
+        (self.count,) = HEADER.unpack_from(buffer, len(MAGIC))
+        self._offsets = len(MAGIC) + HEADER.size
+        self._blob = self._offsets + (self.count + 1) * OFFSET.size
+
+    @classmethod
+    def open(cls, path: str):
+        """Open an index file, or build one in memory from a plain list."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                f.seek(0)
+                return cls(build_index(line.decode("utf-8", "ignore") for line in f))
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, i: int) -> bytes:
+        start, end = struct.unpack_from("<II", self._buf, self._offsets + i * OFFSET.size)
+        return self._buf[self._blob + start : self._blob + end]
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _has(self, key: bytes) -> bool:
+        i = self._lower_bound(key)
+        return i < self.count and self._key(i) == key
+
+    def __contains__(self, name: str) -> bool:
+        return self._has(reverse_name(name))
+
+    def blocked_parent(self, name: str):
+        """Return the closest listed name at or above `name`, or None."""
+        labels = name.strip().lower().rstrip(".").split(".")
+        for i in range(len(labels) - 1):
+            candidate = ".".join(labels[i:])
+            if self._has(reverse_name(candidate)):
+                return candidate
+        return None
+
+    def subdomains(self, name: str):
+        """Yield listed names equal to or under `name`."""
+        key = reverse_name(name)
+        i = self._lower_bound(key)
+        while i < self.count:
+            entry = self._key(i)
+            if entry != key and not entry.startswith(key + b"."):
+                # "com.example-foo" sorts between "com.example" and
+                # "com.example.*"; skip it without ending the range
+                if entry.startswith(key) and entry[len(key) : len(key) + 1] < b".":
+                    i += 1
+                    continue
+                break
+            yield ".".join(reversed(entry.decode("ascii").split(".")))
+            i += 1
+
+
+def filter_known(domains, index: BlockIndex):
+    """Drop domains that are already blocked or under a blocked parent."""
+    for domain in domains:
+        if index.blocked_parent(domain) is None:
+            yield domain
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build and query an index of rpz-block-list.txt")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build the index file")
+    build.add_argument("-i", "--input", default=DEFAULT_LIST, help=f"block list (default: {DEFAULT_LIST})")
+    build.add_argument("-o", "--output", default=DEFAULT_INDEX, help=f"index file (default: {DEFAULT_INDEX})")
+
+    lookup = sub.add_parser("lookup", help="check whether names or their parents are blocked")
+    lookup.add_argument("names", nargs="+")
+
+    suffix = sub.add_parser("suffix", help="list blocked names under a domain")
+    suffix.add_argument("name")
+
+    filt = sub.add_parser("filter", help="drop already blocked names from a domain list")
+    filt.add_argument("-i", "--input", default="-", help="domain list (default: stdin)")
+
+    for command in (lookup, suffix, filt):
+        command.add_argument("--index", default=DEFAULT_INDEX, help=f"index or plain block list (default: {DEFAULT_INDEX})")
+    args = p.parse_args()
+
+    if args.command == "build":
+        with open(args.input, "r", encoding="utf-8", errors="ignore") as f:
+            data = build_index(f)
+        with open(args.output, "wb") as f:
+            f.write(data)
+        print(f"Indexed {HEADER.unpack_from(data, len(MAGIC))[0]} names into {args.output}")
+        return
+
+    index = BlockIndex.open(args.index)
+    if args.command == "lookup":
+        for name in args.names:
+            parent = index.blocked_parent(name)
+            if parent is None:
+                print(f"{name}: not listed")
+            elif parent == name.lower().rstrip("."):
+                print(f"{name}: blocked")
+            else:
+                print(f"{name}: blocked via {parent}")
+    elif args.command == "suffix":
+        for name in index.subdomains(args.name):
+            print(name)
+    else:
+        infile = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", errors="ignore")
+        try:
+            domains = (line.strip() for line in infile if line.strip())
+            sys.stdout.writelines(d + "\n" for d in filter_known(domains, index))
+        finally:
+            if infile is not sys.stdin:
+                infile.close()
+
+
+if __name__ == "__main__":
+    main()
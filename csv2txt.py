@@ -1,10 +1,106 @@
-input_file = "input.csv"
-output_file = "domains.txt"
+import argparse
+import csv
+import sys
 
-with open(input_file, "r", encoding="utf-8") as csv_file, \
-     open(output_file, "w", encoding="utf-8") as txt_file:
+from merge_datas import iter_unique, open_text
 
-    for line in csv_file:
-        parts = line.strip().split(",")
-        if len(parts) == 2:
-            txt_file.write(parts[1] + "\n")
\ No newline at end of file
+
+def _column_index(header, column):
+    if isinstance(column, int) or column.isdigit():
+        return int(column), False
+    # named column: first row must be a header
+    names = [name.strip().lower() for name in header]
+    if column.lower() not in names:
+        raise ValueError(
+            f"column {column!r} not found, available columns: {', '.join(name.strip() for name in header)}"
+        )
+    return names.index(column.lower()), True
+
+
+def iter_csv_domains(stream, column=1, rank_column=None, top=None, delimiter=","):
+    """
+    Stream domains out of a rank list such as Tranco ("1,google.com").
+
+    Args:
+        stream: Text stream to read rows from
+        column: Index or header name of the domain column
+        rank_column: Index or header name of the rank column; when set, rows
+            ranked above `top` are skipped instead of counting rows
+        top: Only keep the top N entries
+        delimiter: Field delimiter
+
+    The first row is read right away, so an unknown column name raises
+    ValueError here rather than on iteration.
+    """
+    reader = csv.reader(stream, delimiter=delimiter)
+    first = next(reader, None)
+    if first is None:
+        return iter(())
+    domain_idx, has_header = _column_index(first, column)
+    rank_idx = None
+    if rank_column is not None:
+        rank_idx, rank_header = _column_index(first, rank_column)
+        has_header = has_header or rank_header
+    rows = reader if has_header else _prepend(first, reader)
+    return _iter_rows(rows, domain_idx, rank_idx, top)
+
+
+def _iter_rows(rows, domain_idx, rank_idx, top):
+    count = 0
+    for row in rows:
+        if rank_idx is None and top is not None and count >= top:
+            break
+        if len(row) <= domain_idx:
+            continue
+        if rank_idx is not None and top is not None:
+            try:
+                if int(row[rank_idx]) > top:
+                    # rank lists are sorted, nothing further can qualify
+                    break
+            except (ValueError, IndexError):
+                continue
+        domain = row[domain_idx].strip().lower().rstrip(".")
+        if not domain or "." not in domain:
+            continue
+        yield domain
+        count += 1
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+
+def main():
+    p = argparse.ArgumentParser(description="Extract the domain column from a CSV rank list")
+    p.add_argument("-i", "--input", default="input.csv", help="input CSV, .csv.gz or .zip (default: input.csv, '-' for stdin)")
+    p.add_argument("-o", "--output", default="domains.txt", help="output file (default: domains.txt, '-' for stdout)")
+    p.add_argument("-c", "--column", default="1", help="domain column index or header name (default: 1)")
+    p.add_argument("-r", "--rank-column", default=None, help="rank column index or header name used with --top")
+    p.add_argument("-n", "--top", type=int, default=None, help="only keep the top N domains")
+    p.add_argument("-d", "--delimiter", default=",", help="field delimiter (default: ',')")
+    p.add_argument("-a", "--append", action="store_true", help="append to the output instead of overwriting it")
+    args = p.parse_args()
+    if args.top is not None and args.top < 1:
+        p.error("--top must be at least 1")
+
+    infile = open_text(args.input)
+    try:
+        domains = iter_unique(
+            iter_csv_domains(infile, args.column, args.rank_column, args.top, args.delimiter)
+        )
+    except ValueError as e:
+        p.error(str(e))
+    try:
+        if args.output == "-":
+            sys.stdout.writelines(d + "\n" for d in domains)
+        else:
+            with open(args.output, "a" if args.append else "w", encoding="utf-8") as f:
+                f.writelines(d + "\n" for d in domains)
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import functools
+import os
+import pickle
+
+PSL_URL = "https://publicsuffix.org/list/public_suffix_list.dat"
+PSL_FILE = "public_suffix_list.dat"
+
+# trie node key holding the rule type of the node
+RULE_KEY = "$"
+RULE = 1
+EXCEPTION = 2
+
+
+class SuffixTrie:
+    """
+    Public Suffix List compiled into a trie of reversed labels
+    ("co.uk" -> root["uk"]["co"]), so finding the registrable domain of a
+    name is one walk over its labels.
+    """
+
+    def __init__(self, rules=()):
+        self.root = {}
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule: str):
+        rule = rule.strip().lower()
+        if not rule or rule.startswith("//"):
+            return
+        rule = rule.split()[0]
+        kind = RULE
+        if rule.startswith("!"):
+            kind = EXCEPTION
+            rule = rule[1:]
+        for variant in _label_variants(rule):
+            node = self.root
+            for label in reversed(variant.split(".")):
+                node = node.setdefault(label, {})
+            node[RULE_KEY] = kind
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f)
+
+    def public_suffix_length(self, labels) -> int:
+        """Number of trailing labels that form the public suffix."""
+        node = self.root
+        best = 1  # implicit "*" rule
+        for i, label in enumerate(reversed(labels), 1):
+            wildcard = node.get("*")
+            if wildcard is not None and wildcard.get(RULE_KEY) == RULE:
+                best = max(best, i)
+            child = node.get(label)
+            if child is not None:
+                kind = child.get(RULE_KEY)
+                if kind == EXCEPTION:
+                    return i - 1
+                if kind == RULE:
+                    best = i
+                node = child
+            elif wildcard is not None:
+                node = wildcard
+            else:
+                break
+        return best
+
+    def registrable_domain(self, name: str):
+        """Return the eTLD+1 of `name`, or None if it is a public suffix."""
+        labels = name.lower().rstrip(".").split(".")
+        n = self.public_suffix_length(labels)
+        if len(labels) <= n:
+            return None
+        return ".".join(labels[-(n + 1):])
+
+
+def _label_variants(rule: str):
+    # the list is in Unicode, scan inputs are usually punycode
+    yield rule
+    try:
+        encoded = rule.encode("idna").decode("ascii")
+    except UnicodeError:
+        return
+    if encoded != rule:
+        yield encoded
+
+
+def download_psl(path: str = PSL_FILE):
+    import requests
+
+    response = requests.get(PSL_URL, timeout=30)
+    response.raise_for_status()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(response.text)
+
+
+@functools.lru_cache(maxsize=None)
+def load_suffix_trie(path: str = PSL_FILE) -> SuffixTrie:
+    """
+    Load the compiled suffix trie once per process. The compiled trie is
+    cached next to the list as a pickle and rebuilt when the list changes.
+    """
+    if not os.path.exists(path):
+        print(f"[Info] Downloading Public Suffix List to {path}")
+        download_psl(path)
+    cache_path = path + ".pickle"
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    trie = SuffixTrie.from_file(path)
+    with open(cache_path, "wb") as f:
+        pickle.dump(trie, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return trie
+
+
+def group_by_registrable_domain(domains, trie: SuffixTrie):
+    """Group domains by eTLD+1, keeping input order inside each group."""
+    groups = {}
+    for domain in domains:
+        key = trie.registrable_domain(domain) or domain
+        groups.setdefault(key, []).append(domain)
+    return groups
+
+
+def pick_representatives(groups, probe_min: int = 3):
+    """
+    First-pass queries: the registrable domain itself (or the first member
+    when it is not in the input) for every group, plus one probe subdomain
+    for groups with at least `probe_min` members to spot zones whose
+    subdomains are treated differently from the parent.
+    """
+    first_pass = []
+    for key, members in groups.items():
+        representative = key if key in members else members[0]
+        first_pass.append(representative)
+        if len(members) >= probe_min:
+            probe = next(d for d in members if d != representative)
+            first_pass.append(probe)
+    return first_pass
+
+
+def expand_groups(groups, statuses):
+    """
+    Second-pass queries: the remaining members of groups where a first-pass
+    query matched, failed, or the representative and probe disagreed.
+    """
+    second_pass = []
+    for members in groups.values():
+        seen = [statuses[d] for d in members if d in statuses]
+        if len(seen) == len(members):
+            continue
+        if "found" in seen or "timeout" in seen or "error" in seen or len(set(seen)) > 1:
+            second_pass.extend(d for d in members if d not in statuses)
+    return second_pass
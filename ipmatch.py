@@ -0,0 +1,103 @@
+"""
+Target address matching on binary addresses.
+
+RPZ landing pages move around inside a netblock, so targets may be single
+addresses or CIDR ranges. A TargetSet is compiled once into one set of
+network integers per prefix length; a lookup is then an integer shift and a
+set membership test per distinct prefix length, with no string handling.
+Single addresses are also kept as packed bytes, so the common exact-match
+case needs no integer conversion at all.
+"""
+
+import ipaddress
+import socket
+import sys
+from array import array
+
+
+class TargetSet:
+    def __init__(self, targets=()):
+        self._exact = set()
+        self._exact_packed = {4: set(), 6: set()}
+        self._has_ranges = False
+        self._ranges = {4: False, 6: False}
+        # {4: {prefix length: {network int}}, 6: {...}}
+        self._prefixes = {4: {}, 6: {}}
+        for target in targets:
+            self.add(target)
+
+    def add(self, target: str):
+        network = ipaddress.ip_network(target.strip(), strict=False)
+        if network.num_addresses == 1:
+            self._exact.add(str(network.network_address))
+            self._exact_packed[network.version].add(network.network_address.packed)
+        else:
+            self._has_ranges = True
+            self._ranges[network.version] = True
+        bits = network.max_prefixlen
+        self._prefixes[network.version].setdefault(network.prefixlen, set()).add(
+            int(network.network_address) >> (bits - network.prefixlen)
+        )
+
+    def _match_int(self, value: int, version: int) -> bool:
+        bits = 32 if version == 4 else 128
+        for length, networks in self._prefixes[version].items():
+            if (value >> (bits - length)) in networks:
+                return True
+        return False
+
+    def matches_packed(self, packed: bytes) -> bool:
+        """Match a 4 or 16 byte packed address."""
+        version = 4 if len(packed) == 4 else 6
+        if packed in self._exact_packed[version]:
+            return True
+        if not self._ranges[version]:
+            return False
+        return self._match_int(int.from_bytes(packed, "big"), version)
+
+    def find_packed(self, column: bytes, width: int):
+        """
+        Yield the indices of matching addresses in `column`, a run of packed
+        addresses `width` (4 or 16) bytes each.
+        """
+        version = 4 if width == 4 else 6
+        if not self._ranges[version]:
+            # exact targets only: let bytes.find scan the column
+            for target in self._exact_packed[version]:
+                pos = column.find(target)
+                while pos != -1:
+                    if pos % width == 0:
+                        yield pos // width
+                    pos = column.find(target, pos + 1)
+            return
+        if width == 4:
+            values = array("I")
+            values.frombytes(column)
+            if sys.byteorder == "little":
+                # addresses are big endian
+                values.byteswap()
+        else:
+            values = (int.from_bytes(column[i : i + 16], "big") for i in range(0, len(column), 16))
+        match = self._match_int
+        for index, value in enumerate(values):
+            if match(value, version):
+                yield index
+
+    def __contains__(self, ip) -> bool:
+        if isinstance(ip, bytes):
+            return self.matches_packed(ip)
+        if not isinstance(ip, str):
+            # ipaddress objects
+            return self._match_int(int(ip), ip.version)
+        if ip in self._exact:
+            return True
+        if not self._has_ranges:
+            # answers arrive as canonical text, so a miss here is final
+            return False
+        try:
+            return self.matches_packed(socket.inet_pton(socket.AF_INET6 if ":" in ip else socket.AF_INET, ip))
+        except OSError:
+            return False
+
+    def __bool__(self):
+        return any(self._prefixes[4]) or any(self._prefixes[6])
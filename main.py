@@ -1,7 +1,258 @@
+import argparse
 import asyncio
 import aiodns
+import itertools
+import os
+import signal
 import time
 
+import etld
+import spool
+from adg2list import iter_domains
+from blockindex import BlockIndex, filter_known
+from csv2txt import iter_csv_domains
+from ipmatch import TargetSet
+from merge_datas import iter_unique, open_text
+from profiling import Profiler
+from resultfile import ResultWriter
+
+
+async def resolve_async(
+    resolver,
+    resolver_index,
+    domain,
+    qtype,
+    retry_delay,
+    max_retries,
+    processed_count,
+    total_domains,
+    resolver_timeouts,
+    rate_data,
+    label="Resolver",
+    probe=None,
+):
+    """
+    Query one record type with retries. Returns (status, answers, ttl) where
+    status is "ok", "nxdomain", "timeout" or "error" and ttl is the lowest
+    answer TTL (None without answers).
+    """
+    attempts = 0
+    while attempts < max_retries:
+        attempts += 1
+        try:
+            # Set a timeout for the DNS query
+            response = await asyncio.wait_for(
+                resolver.query(domain, qtype), timeout=resolver.timeout
+            )
+            if probe:
+                probe.mark("resolve")
+            if not response:
+                return "ok", [], None
+            answers = [record.host for record in response]
+            ttl = min(record.ttl for record in response)
+            if probe:
+                probe.mark("answers")
+            return "ok", answers, ttl
+
+        except aiodns.error.DNSError as e:
+            error_code = e.args[0]
+            if error_code == aiodns.error.ARES_ENODATA:
+                # name exists, no records of this type
+                return "ok", [], None
+            if error_code == aiodns.error.ARES_ENOTFOUND:
+                print(
+                    f"[NXDOMAIN] Domain: {domain} ({qtype}, {label} {resolver_index + 1}), Checked: {processed_count[0]}/{total_domains}, Rate: {rate_data['rate']:.2f} domains/sec"
+                )
+                return "nxdomain", [], None
+            if error_code != aiodns.error.ARES_ETIMEOUT:
+                print(
+                    f"[Error] Failed to query domain: {domain} ({qtype}, {label} {resolver_index + 1}), Error: {e}, Checked: {processed_count[0]}/{total_domains}, Rate: {rate_data['rate']:.2f} domains/sec"
+                )
+                return "error", [], None
+
+        except asyncio.TimeoutError:
+            pass
+
+        resolver_timeouts[resolver_index] += 1
+        print(
+            f"[Timeout] Retrying domain: {domain} ({qtype}, {label} {resolver_index + 1}) (Attempt {attempts}), Rate: {rate_data['rate']:.2f} domains/sec"
+        )
+        if attempts < max_retries:
+            slept = time.perf_counter()
+            await asyncio.sleep(retry_delay)
+            if probe:
+                probe.exclude("retry", time.perf_counter() - slept)
+
+    print(
+        f"[Timeout] Max retries reached for domain: {domain} ({qtype}, {label} {resolver_index + 1}), Checked: {processed_count[0]}/{total_domains}. Skipping..., Rate: {rate_data['rate']:.2f} domains/sec"
+    )
+    return "timeout", [], None
+
+
+def merge_statuses(statuses):
+    # a qtype that never completed leaves the domain unclassified, even if
+    # another one answered; a target match still overrides this to "found"
+    for status in ("timeout", "error", "ok"):
+        if status in statuses:
+            return status
+    return "nxdomain"
+
+
+async def resolve_qtypes_async(
+    resolver,
+    resolver_index,
+    domain,
+    qtypes,
+    retry_delay,
+    max_retries,
+    processed_count,
+    total_domains,
+    resolver_timeouts,
+    rate_data,
+    label="Resolver",
+    probe=None,
+):
+    """Query all record types on one resolver together and merge the answers."""
+    queries = [
+        resolve_async(
+            resolver,
+            resolver_index,
+            domain,
+            qtype,
+            retry_delay,
+            max_retries,
+            processed_count,
+            total_domains,
+            resolver_timeouts,
+            rate_data,
+            label,
+            probe,
+        )
+        for qtype in qtypes
+    ]
+    if len(queries) == 1:
+        return await queries[0]
+    results = await asyncio.gather(*queries)
+    ttls = [result[2] for result in results if result[2] is not None]
+    return (
+        merge_statuses([result[0] for result in results]),
+        [ip for result in results for ip in result[1]],
+        min(ttls) if ttls else None,
+    )
+
+
+def divergence(status, answers, control_answer, matched, compare_answers=False):
+    """
+    Why the scanned resolver's answer differs from the control's, or None.
+
+    Only target hits and one-sided NXDOMAIN are reported by default. With
+    `compare_answers`, fully disjoint answer sets are reported too; CDN and
+    geo-balanced names routinely get those, so expect many false positives.
+    """
+    control_status, control_ips, _ = control_answer
+    if status in ("timeout", "error") or control_status in ("timeout", "error"):
+        return None
+    if matched is not None and matched not in control_ips:
+        return "target"
+    if status == "nxdomain" and control_ips:
+        return "nxdomain"
+    if control_status == "nxdomain" and answers:
+        return "control-nxdomain"
+    if compare_answers and answers and control_ips and not set(answers) & set(control_ips):
+        return "answers"
+    return None
+
+
+class ControlPool:
+    """
+    Unfiltered control resolvers for differential scans. Control answers are
+    cached by TTL, so a domain seen again never hits the control twice while
+    its answer is fresh; divergent domains are appended to `output_file`.
+    """
+
+    NEGATIVE_TTL = 300
+    # a full cache is trimmed to this fraction of max_entries, so the O(n)
+    # sweep runs once per max_entries / 10 inserts rather than on every one
+    EVICT_TO = 0.9
+
+    def __init__(self, resolver_map, output_file, max_entries=1_000_000, compare_answers=False):
+        self.resolver_map = resolver_map
+        self.resolver_timeouts = [0] * len(resolver_map)
+        self.output_file = output_file
+        self.compare_answers = compare_answers
+        self.max_entries = max_entries
+        self.cache = {}
+        self.hits = 0
+        self.divergent = 0
+        self.output = open(output_file, "a")
+
+    async def lookup(
+        self,
+        domain,
+        qtypes,
+        retry_delay,
+        max_retries,
+        processed_count,
+        total_domains,
+        rate_data,
+    ):
+        now = time.monotonic()
+        cached = self.cache.get(domain)
+        if cached is not None and cached[0] > now:
+            self.hits += 1
+            return cached[1]
+
+        resolver_index = hash(domain) % len(self.resolver_map)
+        answer = await resolve_qtypes_async(
+            self.resolver_map[resolver_index],
+            resolver_index,
+            domain,
+            qtypes,
+            retry_delay,
+            max_retries,
+            processed_count,
+            total_domains,
+            self.resolver_timeouts,
+            rate_data,
+            "Control",
+        )
+        status, _, ttl = answer
+        # failures are not cached, they should be retried next time
+        if status in ("ok", "nxdomain"):
+            # re-insert so dict order stays oldest first
+            self.cache.pop(domain, None)
+            if len(self.cache) >= self.max_entries:
+                self._evict(now)
+            self.cache[domain] = (now + (ttl if ttl is not None else self.NEGATIVE_TTL), answer)
+        return answer
+
+    def _evict(self, now):
+        for key in [key for key, (expires, _) in self.cache.items() if expires <= now]:
+            del self.cache[key]
+        # still too full: drop the oldest entries
+        excess = len(self.cache) - int(self.max_entries * self.EVICT_TO)
+        if excess > 0:
+            for key in list(itertools.islice(self.cache, excess)):
+                del self.cache[key]
+
+    def compare(self, domain, status, answers, control_answer, matched):
+        reason = divergence(status, answers, control_answer, matched, self.compare_answers)
+        if reason is None:
+            return
+        self.divergent += 1
+        print(
+            f"[Diverge] Domain: {domain} ({reason}), Resolver: {','.join(answers) or status}, Control: {','.join(control_answer[1]) or control_answer[0]}"
+        )
+        self.output.write(
+            f"{domain}\t{reason}\t{','.join(answers)}\t{','.join(control_answer[1])}\n"
+        )
+
+    def close(self):
+        self.output.close()
+        print(
+            f"[Info] Written {self.divergent} divergent domains to {self.output_file}, control cache hits: {self.hits}"
+        )
+
 
 async def query_domain_async(
     sem,
@@ -18,81 +269,93 @@ async def query_domain_async(
     write_threshold,
     resolver_timeouts,
     rate_data,
+    result_writer=None,
+    profiler=None,
+    qtypes=("A",),
+    control=None,
 ):
+    probe = profiler.probe() if profiler else None
     async with sem:  # Acquire semaphore
-        attempts = 0
+        if probe:
+            probe.mark("wait")
         resolver_index = hash(domain) % len(resolver_map)
         resolver = resolver_map[resolver_index]
 
-        while attempts < max_retries:
-            attempts += 1
-            try:
-                # Set a timeout for the DNS query
-                response = await asyncio.wait_for(
-                    resolver.query(domain, "A"), timeout=resolver.timeout
-                )
+        # all record types go to the same resolver together; in differential
+        # mode the control pool is queried at the same time
+        isp_query = resolve_qtypes_async(
+            resolver,
+            resolver_index,
+            domain,
+            qtypes,
+            retry_delay,
+            max_retries,
+            processed_count,
+            total_domains,
+            resolver_timeouts,
+            rate_data,
+            probe=probe,
+        )
+        if control is None:
+            status, answers, _ = await isp_query
+        else:
+            (status, answers, _), control_answer = await asyncio.gather(
+                isp_query,
+                control.lookup(
+                    domain,
+                    qtypes,
+                    retry_delay,
+                    max_retries,
+                    processed_count,
+                    total_domains,
+                    rate_data,
+                ),
+            )
+        if probe:
+            # failed lookups and a slower control query end here
+            probe.mark("resolve")
 
-                if response:
-                    for record in response:
-                        ip = str(record.host)
-                        if ip in target_ips:
-                            matching_domains.add(domain)
-                            processed_count[0] += 1
-                            rate_data["found"] += 1
-                            print(
-                                f"[Found] Domain: {domain} (Resolver {resolver_index + 1}) connected to {ip}, Match #{len(matching_domains)}, Checked: {processed_count[0]}/{total_domains}, Rate: {rate_data['rate']:.2f} domains/sec"
-                            )
-                            write_counter[0] += 1
-                            if write_counter[0] >= write_threshold:
-                                await write_to_file_async(
-                                    output_file, matching_domains, write_counter
-                                )  # Use async write
-                            return
-                processed_count[0] += 1
-                rate_data["processed"] += 1
-                return
-
-            except aiodns.error.DNSError as e:
-                error_code = e.args[0]
-                if error_code == aiodns.error.ARES_ENOTFOUND:
-                    print(
-                        f"[NXDOMAIN] Domain: {domain} (Resolver {resolver_index + 1}), Checked: {processed_count[0]}/{total_domains}, Rate: {rate_data['rate']:.2f} domains/sec"
-                    )
-                elif error_code == aiodns.error.ARES_ETIMEOUT:
-                    resolver_timeouts[resolver_index] += 1
-                    print(
-                        f"[Timeout] Retrying domain: {domain} (Resolver {resolver_index + 1}) (Attempt {attempts}), Rate: {rate_data['rate']:.2f} domains/sec"
-                    )
-                    if attempts < max_retries:
-                        await asyncio.sleep(retry_delay)
-                        continue
-                    else:
-                        print(
-                            f"[Timeout] Max retries reached for domain: {domain} (Resolver {resolver_index + 1}), Checked: {processed_count[0]}/{total_domains}. Skipping..., Rate: {rate_data['rate']:.2f} domains/sec"
-                        )
-                else:
-                    print(
-                        f"[Error] Failed to query domain: {domain} (Resolver {resolver_index + 1}), Error: {e}, Checked: {processed_count[0]}/{total_domains}, Rate: {rate_data['rate']:.2f} domains/sec"
-                    )
-                processed_count[0] += 1
-                rate_data["processed"] += 1
-                return
-
-            except asyncio.TimeoutError:
-                resolver_timeouts[resolver_index] += 1
-                print(
-                    f"[Timeout] Retrying domain: {domain} (Resolver {resolver_index + 1}) (Attempt {attempts}), Rate: {rate_data['rate']:.2f} domains/sec"
-                )
-                if attempts < max_retries:
-                    await asyncio.sleep(retry_delay)
-                    continue
-                else:
-                    print(
-                        f"[Timeout] Max retries reached for domain: {domain} (Resolver {resolver_index + 1}), Checked: {processed_count[0]}/{total_domains}. Skipping..., Rate: {rate_data['rate']:.2f} domains/sec"
-                    )
-                processed_count[0] += 1
-                rate_data["processed"] += 1
-                return
+        # pycares already hands back text; TargetSet matches exact addresses
+        # without parsing and ranges on ints
+        matched = next((ip for ip in answers if ip in target_ips), None)
+        if matched is not None:
+            status = "found"
+        if probe:
+            probe.mark("classify")
+        if result_writer:
+            result_writer.write(domain, status, resolver_index, answers)
+            if probe:
+                probe.mark("results")
+        if control is not None:
+            control.compare(domain, status, answers, control_answer, matched)
+            if probe:
+                probe.mark("compare")
+
+        processed_count[0] += 1
+        if matched is not None:
+            matching_domains.add(domain)
+            rate_data["found"] += 1
+            write_counter[0] += 1
+            if probe:
+                probe.mark("record")
+            print(
+                f"[Found] Domain: {domain} (Resolver {resolver_index + 1}) connected to {matched}, Match #{len(matching_domains)}, Checked: {processed_count[0]}/{total_domains}, Rate: {rate_data['rate']:.2f} domains/sec"
+            )
+            if probe:
+                probe.mark("print")
+            if write_counter[0] >= write_threshold:
+                await write_to_file_async(
+                    output_file, matching_domains, write_counter
+                )  # Use async write
+                if probe:
+                    probe.mark("file")
+        else:
+            rate_data["processed"] += 1
+            if probe:
+                probe.mark("record")
+        if probe:
+            probe.finish()
+        return status
 
 
 async def write_to_file_async(output_file, matching_domains, write_counter):
@@ -124,9 +387,22 @@ async def worker_async(
     write_threshold,
     resolver_timeouts,
     rate_data,
+    statuses=None,
+    result_writer=None,
+    profiler=None,
+    qtypes=("A",),
+    inflight=None,
+    control=None,
 ):
     for domain in domains:
-        await query_domain_async(
+        pending = inflight.get(domain) if inflight is not None else None
+        if pending is not None:
+            # already being queried by another worker, share its result
+            status = await pending
+            if statuses is not None:
+                statuses[domain] = status
+            continue
+        query = query_domain_async(
             sem,
             resolver_map,
             domain,
@@ -141,7 +417,59 @@ async def worker_async(
             write_threshold,
             resolver_timeouts,
             rate_data,
+            result_writer,
+            profiler,
+            qtypes,
+            control,
         )
+        if inflight is None:
+            status = await query
+        else:
+            task = asyncio.ensure_future(query)
+            inflight[domain] = task
+            task.add_done_callback(lambda _, d=domain: inflight.pop(d, None))
+            status = await task
+        if statuses is not None:
+            statuses[domain] = status
+
+
+def load_domains(input_file, input_format="list", top=None):
+    """
+    Read the scan input. Plain lists are one domain per line; hosts files and
+    AdGuard/ABP filter lists are parsed on the fly by adg2list, and CSV rank
+    lists by csv2txt. Input may be .gz or .zip compressed.
+    """
+    with open_text(input_file) as f:
+        if input_format == "list":
+            domains = (line.strip() for line in f)
+        elif input_format == "csv":
+            domains = iter_csv_domains(f, top=top)
+        else:
+            domains = iter_domains(f, "auto" if input_format == "filter" else input_format)
+        return list(iter_unique(domains))
+
+
+async def update_rate_async(rate_data):
+    while True:
+        await asyncio.sleep(1)
+        elapsed_time = time.time() - rate_data["last_time"]
+        if elapsed_time > 0:
+            rate_data["rate"] = (
+                rate_data["processed"] - rate_data["last_processed"]
+            ) / elapsed_time
+            rate_data["last_processed"] = rate_data["processed"]
+            rate_data["last_time"] = time.time()
+
+
+def create_resolvers(loop, dns_servers, timeout):
+    # one resolver per server
+    resolver_map = []
+    for dns_server in dns_servers:
+        resolver = aiodns.DNSResolver(loop=loop)
+        resolver.nameservers = [dns_server]
+        resolver.timeout = timeout
+        resolver_map.append(resolver)
+    return resolver_map
 
 
 async def query_domains_async(
@@ -152,19 +480,34 @@ async def query_domains_async(
     retry_delay,
     max_retries,
     num_tasks,
+    input_format="list",
+    top=None,
+    group_by_etld=False,
+    skip_known=None,
+    results_file=None,
+    timeout=5,
+    profiler=None,
+    qtypes=("A",),
+    control_servers=None,
+    diff_output="divergent_domains.txt",
+    diff_answers=False,
 ):
     loop = asyncio.get_running_loop()
 
-    # Create multiple resolvers
-    resolver_map = []
-    for dns_server in dns_servers:
-        resolver = aiodns.DNSResolver(loop=loop)
-        resolver.nameservers = [dns_server]
-        resolver.timeout = 5
-        resolver_map.append(resolver)
+    resolver_map = create_resolvers(loop, dns_servers, timeout)
+    control = None
+    if control_servers:
+        # separate pool so control queries never queue behind scanned ones
+        control = ControlPool(
+            create_resolvers(loop, control_servers, timeout), diff_output, compare_answers=diff_answers
+        )
 
-    with open(input_file, "r") as f:
-        domains = [line.strip() for line in f if line.strip()]
+    domains = load_domains(input_file, input_format, top)
+    if skip_known:
+        # names already on the block list (or under a listed parent) need no query
+        loaded = len(domains)
+        domains = list(filter_known(domains, BlockIndex.open(skip_known)))
+        print(f"[Info] Skipping {loaded - len(domains)} domains already in {skip_known}")
 
     matching_domains = set()
     total_domains = len(domains)
@@ -183,39 +526,71 @@ async def query_domains_async(
         "rate": 0,
     }
 
-    async def update_rate():
-        while True:
-            await asyncio.sleep(1)
-            elapsed_time = time.time() - rate_data["last_time"]
-            if elapsed_time > 0:
-                rate_data["rate"] = (
-                    rate_data["processed"] - rate_data["last_processed"]
-                ) / elapsed_time
-                rate_data["last_processed"] = rate_data["processed"]
-                rate_data["last_time"] = time.time()
-
-    rate_task = asyncio.create_task(update_rate())
-    tasks = [
-        worker_async(
-            sem,
-            domains,
-            resolver_map,
-            target_ips,
-            matching_domains,
-            processed_count,
-            total_domains,
-            retry_delay,
-            max_retries,
-            output_file,
-            write_counter,
-            write_threshold,
-            resolver_timeouts,
-            rate_data,
+    rate_task = asyncio.create_task(update_rate_async(rate_data))
+    if profiler:
+        profiler.start()
+    result_writer = ResultWriter(results_file) if results_file else None
+
+    # domains currently being queried, shared by all workers
+    inflight = {}
+
+    async def run(batch, statuses=None):
+        # num_tasks workers pull from one shared iterator
+        batch = iter(batch)
+        await asyncio.gather(
+            *(
+                worker_async(
+                    sem,
+                    batch,
+                    resolver_map,
+                    target_ips,
+                    matching_domains,
+                    processed_count,
+                    total_domains,
+                    retry_delay,
+                    max_retries,
+                    output_file,
+                    write_counter,
+                    write_threshold,
+                    resolver_timeouts,
+                    rate_data,
+                    statuses,
+                    result_writer,
+                    profiler,
+                    qtypes,
+                    inflight,
+                    control,
+                )
+                for _ in range(num_tasks)
+            )
         )
-    ]
-    await asyncio.gather(*tasks)
+
+    if group_by_etld:
+        # query one representative per eTLD+1 first, expand only where the
+        # zone is blocked or looks heterogeneous
+        groups = etld.group_by_registrable_domain(domains, etld.load_suffix_trie())
+        first_pass = etld.pick_representatives(groups)
+        print(
+            f"[Info] {total_domains} domains in {len(groups)} registrable domains, querying {len(first_pass)} first"
+        )
+        statuses = {}
+        await run(first_pass, statuses)
+        second_pass = etld.expand_groups(groups, statuses)
+        print(
+            f"[Info] Expanding {len(second_pass)} subdomains, skipping {total_domains - len(first_pass) - len(second_pass)}"
+        )
+        await run(second_pass)
+    else:
+        await run(domains)
 
     rate_task.cancel()
+    if profiler:
+        profiler.stop()
+    if control:
+        control.close()
+    if result_writer:
+        result_writer.close()
+        print(f"[Info] Written {result_writer.count} results to {results_file}")
 
     # Write any remaining domains
     if write_counter[0] > 0:
@@ -227,10 +602,351 @@ async def query_domains_async(
     print(f"Final rate: {final_rate:.2f} domains/sec")
 
 
+async def watch_spool_async(
+    spool_dir,
+    block_list,
+    dns_servers,
+    target_ips,
+    retry_delay,
+    max_retries,
+    num_tasks,
+    results_file=None,
+    timeout=5,
+    profiler=None,
+    qtypes=("A",),
+    control_servers=None,
+    diff_output="divergent_domains.txt",
+    recheck_file=None,
+    recheck_interval=86400,
+    poll_interval=10,
+    diff_answers=False,
+):
+    """
+    Service mode: keep the resolvers and worker pool alive, stream every new
+    .txt/.gz file dropped into `spool_dir` into it, and append new matches to
+    `block_list` as they are found. Domains from `recheck_file` are re-queried
+    every `recheck_interval` seconds, but only while no fresh domains wait.
+    Runs until SIGINT/SIGTERM.
+    """
+    loop = asyncio.get_running_loop()
+
+    resolver_map = create_resolvers(loop, dns_servers, timeout)
+    control = None
+    if control_servers:
+        control = ControlPool(
+            create_resolvers(loop, control_servers, timeout), diff_output, compare_answers=diff_answers
+        )
+
+    known = set()
+    if os.path.exists(block_list):
+        known.update(spool.iter_file_domains(block_list))
+    block_out = open(block_list, "a")
+
+    matching_domains = set()
+    total_domains = "?"
+    processed_count = [0]
+    write_counter = [0]
+    # matches go to the block list below, never rewrite an output file
+    write_threshold = float("inf")
+    resolver_timeouts = [0] * len(resolver_map)
+    sem = asyncio.Semaphore(num_tasks)
+    rate_data = {
+        "processed": 0,
+        "found": 0,
+        "last_processed": 0,
+        "last_time": time.time(),
+        "rate": 0,
+    }
+    result_writer = ResultWriter(results_file, append=True) if results_file else None
+    inflight = {}
+
+    # fresh domains sort before re-checks; seq keeps FIFO order within each
+    fresh_priority, recheck_priority = 0, 1
+    queue = asyncio.PriorityQueue(maxsize=num_tasks * 20)
+    seq = itertools.count()
+    fresh_pending = [0]
+    # paths being scanned; a path is forgotten once its file is archived so
+    # a producer can drop the same file name again. A file that cannot be
+    # moved stays here and is never re-read while the service runs.
+    seen = set()
+
+    def finish_file(source):
+        try:
+            done = spool.archive(source.path, spool_dir)
+        except OSError as e:
+            print(f"[Error] Failed to archive {source.path}, leaving it in place until restart, Error: {e}")
+            return
+        print(f"[Info] Finished {source.path}, moved to {done}")
+        seen.discard(source.path)
+
+    def fail_file(source, error):
+        # domains already queued still get scanned, but the file is not
+        # archived as done
+        source.failed = True
+        print(f"[Error] Failed to read {source.path}, Error: {error}")
+        try:
+            failed = spool.archive(source.path, spool_dir, spool.FAILED_DIR)
+        except OSError as e:
+            print(f"[Error] Failed to move {source.path} aside, leaving it in place until restart, Error: {e}")
+            return
+        print(f"[Info] Moved {source.path} to {failed}")
+        seen.discard(source.path)
+
+    async def worker():
+        while True:
+            priority, _, domain, source = await queue.get()
+            statuses = {}
+            try:
+                await worker_async(
+                    sem,
+                    [domain],
+                    resolver_map,
+                    target_ips,
+                    matching_domains,
+                    processed_count,
+                    total_domains,
+                    retry_delay,
+                    max_retries,
+                    None,
+                    write_counter,
+                    write_threshold,
+                    resolver_timeouts,
+                    rate_data,
+                    statuses,
+                    result_writer,
+                    profiler,
+                    qtypes,
+                    inflight,
+                    control,
+                )
+                status = statuses.get(domain)
+                if status == "found" and domain not in known:
+                    known.add(domain)
+                    block_out.write(domain + "\n")
+                    block_out.flush()
+                    print(f"[Info] Added {domain} to {block_list}")
+                elif priority == recheck_priority and status in ("ok", "nxdomain"):
+                    print(f"[Recheck] Domain: {domain} is no longer redirected")
+            except Exception as e:
+                # keep the service running, one bad domain must not kill a worker
+                print(f"[Error] Failed to process domain: {domain}, Error: {e}")
+            finally:
+                if priority == fresh_priority:
+                    fresh_pending[0] -= 1
+                if source is not None:
+                    source.pending -= 1
+                    if source.finished():
+                        finish_file(source)
+                queue.task_done()
+
+    async def poll_spool():
+        while True:
+            try:
+                paths = spool.find_new_files(spool_dir, seen)
+            except OSError as e:
+                print(f"[Error] Failed to list {spool_dir}, Error: {e}")
+                paths = []
+            for path in paths:
+                seen.add(path)
+                source = spool.SpoolFile(path)
+                print(f"[Info] Queuing domains from {path}")
+                try:
+                    for domain in spool.iter_file_domains(path):
+                        if domain in known:
+                            continue
+                        source.pending += 1
+                        fresh_pending[0] += 1
+                        await queue.put((fresh_priority, next(seq), domain, source))
+                except Exception as e:
+                    # corrupt or unreadable drop, keep watching for others
+                    fail_file(source, e)
+                    continue
+                source.read_done = True
+                if source.finished():
+                    finish_file(source)
+            await asyncio.sleep(poll_interval)
+
+    async def feed_rechecks():
+        while True:
+            for domain in spool.iter_file_domains(recheck_file):
+                while fresh_pending[0] > 0:
+                    await asyncio.sleep(1)
+                await queue.put((recheck_priority, next(seq), domain, None))
+            await asyncio.sleep(recheck_interval)
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    if profiler:
+        profiler.start()
+    tasks = [asyncio.create_task(update_rate_async(rate_data)), asyncio.create_task(poll_spool())]
+    tasks += [asyncio.create_task(worker()) for _ in range(num_tasks)]
+    if recheck_file:
+        tasks.append(asyncio.create_task(feed_rechecks()))
+    print(f"[Info] Watching {spool_dir} for new domain lists, matches go to {block_list}")
+
+    await stop.wait()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if profiler:
+        profiler.stop()
+    if control:
+        control.close()
+    if result_writer:
+        result_writer.close()
+    block_out.close()
+    print(f"Stopped. Checked: {processed_count[0]}, new matches: {len(matching_domains)}")
+
+
 if __name__ == "__main__":
-    input_file = "domains.txt"
-    output_file = "matching_domains.txt"
-    dns_servers = [
+    parser = argparse.ArgumentParser(description="Scan domains for RPZ redirects")
+    # None defaults so options that --watch does not use can be detected
+    parser.add_argument("-i", "--input", default=None, help="input file (default: domains.txt)")
+    parser.add_argument(
+        "-o", "--output", default=None, help="output file (default: matching_domains.txt)"
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=("list", "hosts", "adguard", "filter", "csv"),
+        default=None,
+        help="input syntax: plain list (default), hosts file, AdGuard/ABP list, auto-detected filter list, or CSV rank list",
+    )
+    parser.add_argument(
+        "--top", type=int, default=None, help="only scan the top N domains of a CSV rank list"
+    )
+    parser.add_argument(
+        "--group-by-etld",
+        action="store_true",
+        help="query one domain per registrable domain (eTLD+1) first and expand only blocked or mixed zones",
+    )
+    parser.add_argument(
+        "--skip-known",
+        metavar="INDEX",
+        default=None,
+        help="skip domains already covered by a block list index (blockindex.py) or plain block list",
+    )
+    parser.add_argument(
+        "--results",
+        default=None,
+        help="also write every answer to a binary result file (see resultfile.py)",
+    )
+    parser.add_argument(
+        "--dns-server",
+        action="append",
+        default=None,
+        help="resolver to query, as ip or ip:port (repeatable, default: built-in list)",
+    )
+    parser.add_argument(
+        "--target-ip",
+        action="append",
+        default=None,
+        help="RPZ landing address or CIDR range to match (repeatable, default: 182.173.0.181)",
+    )
+    parser.add_argument(
+        "--qtype",
+        action="append",
+        choices=("A", "AAAA"),
+        default=None,
+        help="record types to query, sent together to one resolver (repeatable, default: A)",
+    )
+    parser.add_argument(
+        "--control-server",
+        action="append",
+        default=None,
+        help="unfiltered control resolver (ip or ip:port, repeatable); queried alongside each domain to flag divergent answers",
+    )
+    parser.add_argument(
+        "--diff-output",
+        default="divergent_domains.txt",
+        help="with --control-server, append divergent domains here",
+    )
+    parser.add_argument(
+        "--diff-answers",
+        action="store_true",
+        help="with --control-server, also flag domains whose answers share no address with the control's; noisy, CDN and geo-balanced names differ routinely",
+    )
+    parser.add_argument("--num-tasks", type=int, default=50, help="concurrent queries")
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--retry-delay", type=float, default=0.5)
+    parser.add_argument(
+        "--timeout", type=float, default=5, help="per-query timeout in seconds"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time sampled queries per stage and measure event loop lag (SIGUSR1 dumps stats)",
+    )
+    parser.add_argument(
+        "--profile-sample",
+        type=int,
+        default=100,
+        help="with --profile, time one in N queries (default: 100)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        default=None,
+        help="with --profile, SIGUSR2 starts/stops cProfile and writes stats here",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="with --profile, trace allocations and snapshot them on SIGUSR1",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="SPOOL_DIR",
+        default=None,
+        help="run as a service: scan new .txt/.gz files dropped into SPOOL_DIR and append matches to --block-list",
+    )
+    parser.add_argument(
+        "--block-list",
+        default="rpz-block-list.txt",
+        help="with --watch, block list that new matches are appended to",
+    )
+    parser.add_argument(
+        "--recheck",
+        metavar="FILE",
+        default=None,
+        help="with --watch, domains to re-check when no fresh domains are waiting",
+    )
+    parser.add_argument(
+        "--recheck-interval",
+        type=float,
+        default=86400,
+        help="with --watch, seconds between re-check rounds (default: 86400)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10,
+        help="with --watch, seconds between spool directory scans (default: 10)",
+    )
+    args = parser.parse_args()
+    if args.top is not None and args.input_format != "csv":
+        parser.error("--top only applies to CSV rank lists, use it with --input-format csv")
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+    if args.watch:
+        unused = [
+            option
+            for option, value in (
+                ("--input", args.input),
+                ("--output", args.output),
+                ("--input-format", args.input_format),
+                ("--skip-known", args.skip_known),
+                ("--group-by-etld", args.group_by_etld),
+            )
+            if value
+        ]
+        if unused:
+            parser.error(f"{', '.join(unused)} cannot be used with --watch, spool files are plain or gzip lists")
+
+    input_file = args.input or "domains.txt"
+    output_file = args.output or "matching_domains.txt"
+    input_format = args.input_format or "list"
+    dns_servers = args.dns_server or [
         "101.101.101.101",
         "168.95.1.1",
         "168.95.192.1",
@@ -239,19 +955,60 @@ if __name__ == "__main__":
         "203.133.1.6",
         "210.243.121.155",
     ]
-    target_ips = {"182.173.0.181"}
-    retry_delay = 0.5
-    max_retries = 2
-    num_tasks = 50
-
-    asyncio.run(
-        query_domains_async(
-            input_file,
-            output_file,
-            dns_servers,
-            target_ips,
-            retry_delay,
-            max_retries,
-            num_tasks,
-        )
+    target_ips = TargetSet(args.target_ip or ["182.173.0.181"])
+    retry_delay = args.retry_delay
+    max_retries = args.max_retries
+    num_tasks = args.num_tasks
+    profiler = (
+        Profiler(args.profile_sample, args.cprofile, args.tracemalloc)
+        if args.profile
+        else None
     )
+
+    qtypes = tuple(dict.fromkeys(args.qtype or ["A"]))
+
+    if args.watch:
+        asyncio.run(
+            watch_spool_async(
+                args.watch,
+                args.block_list,
+                dns_servers,
+                target_ips,
+                retry_delay,
+                max_retries,
+                num_tasks,
+                args.results,
+                args.timeout,
+                profiler,
+                qtypes,
+                args.control_server,
+                args.diff_output,
+                args.recheck,
+                args.recheck_interval,
+                args.poll_interval,
+                diff_answers=args.diff_answers,
+            )
+        )
+    else:
+        asyncio.run(
+            query_domains_async(
+                input_file,
+                output_file,
+                dns_servers,
+                target_ips,
+                retry_delay,
+                max_retries,
+                num_tasks,
+                input_format,
+                args.top,
+                args.group_by_etld,
+                args.skip_known,
+                args.results,
+                args.timeout,
+                profiler,
+                qtypes,
+                args.control_server,
+                args.diff_output,
+                diff_answers=args.diff_answers,
+            )
+        )
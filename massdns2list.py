@@ -1,11 +1,23 @@
+from ipmatch import TargetSet
+from resultfile import is_result_file, read_blocks
+
+# single addresses or CIDR ranges
+TARGET_IPS = TargetSet(["182.173.0.181", "34.102.218.71"])
+
+
 def filter_domains_from_file(filepath, output_filepath):
     filtered_domains = set()
     try:
-        with open(filepath, "r") as f:
-            for line in f:
-                if "182.173.0.181" in line or "34.102.218.71" in line:
+        if is_result_file(filepath):
+            # binary results (resultfile.py): search the packed address
+            # columns a block at a time
+            for block in read_blocks(filepath):
+                filtered_domains.update(block.matching(TARGET_IPS))
+        else:
+            with open(filepath, "r") as f:
+                for line in f:
                     parts = line.split()
-                    if len(parts) >= 3:
+                    if len(parts) >= 3 and parts[1] in ("A", "AAAA") and parts[2] in TARGET_IPS:
                         domain = parts[0].rstrip(".")
                         filtered_domains.add(domain)
     except FileNotFoundError:
@@ -20,6 +32,6 @@ def filter_domains_from_file(filepath, output_filepath):
         print(f"Error writing to output file: {e}")
 
 # config
-filepath = "results.txt"
+filepath = "results.txt"  # massdns -o S output, or a binary result file
 output_filepath = "rpz-block-list.txt"
 filter_domains_from_file(filepath, output_filepath)
@@ -1,8 +1,55 @@
+import codecs
 import glob
+import gzip
+import io
 import os
+import sys
+import zipfile
 
 
-def merge_datas(data_path="/", output_filename="domains.txt"):
+def open_text(path):
+    """Open a plain, .gz or .zip (first member) file for text reading."""
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="ignore", newline="")
+    if path.endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        member = archive.open(archive.namelist()[0])
+        return io.TextIOWrapper(member, encoding="utf-8", errors="ignore", newline="")
+    return open(path, "r", encoding="utf-8", errors="ignore", newline="")
+
+
+def is_utf8(path, chunk_size=1 << 20):
+    """
+    Decode a whole file without keeping it, to reject binary files up front.
+    Memory stays bounded, but the file is read twice when it is then merged.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError:
+                return False
+    try:
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def iter_unique(domains):
+    """Yield each non-empty domain once, keeping first-seen order."""
+    seen = set()
+    for domain in domains:
+        domain = domain.strip()
+        if domain and domain not in seen:
+            seen.add(domain)
+            yield domain
+
+
+def merge_datas(data_path="/", output_filename="domains.txt", dedup=False, sources=()):
     """
     Merges all .txt files found in the specified directory patterns within the given data_path:
     - data_path/*/*.txt
@@ -12,6 +59,14 @@ def merge_datas(data_path="/", output_filename="domains.txt"):
     Args:
         data_path: The root directory to search for .txt files.
         output_filename: The name of the file to write the merged content to.
+        dedup: Drop blank lines and domains already written.
+
+    Every file is decoded once by is_utf8() before it is streamed, so a bad
+    file is skipped whole instead of half-merged. That doubles the read I/O,
+    which is noticeable on multi-GB lists; the second pass is usually served
+    from the page cache when the file fits in memory.
+        sources: Extra iterables of domains (e.g. csv2txt.iter_csv_domains)
+            streamed into the output after the files.
     """
 
     # Create a list of file paths matching the patterns, using the provided data_path
@@ -25,24 +80,36 @@ def merge_datas(data_path="/", output_filename="domains.txt"):
         file_paths.extend(glob.glob(pattern))
 
     # Check if any files were found
-    if not file_paths:
+    if not file_paths and not sources:
         print(f"No .txt files found in '{data_path}' matching the specified patterns.")
         return
 
-    # Merge the contents of the files
-    with open(output_filename, "w", encoding="utf-8") as outfile:
+    def iter_lines():
         for file_path in file_paths:
             try:
+                # lines are streamed into the output, so check the whole file
+                # first: a bad file is skipped entirely, never merged in part
+                if not is_utf8(file_path):
+                    print(f"Skipped file (likely binary): {file_path}")
+                    continue
                 with open(file_path, "r", encoding="utf-8") as infile:
-                    outfile.write(infile.read())
-                    outfile.write(
-                        "\n"
-                    )  # Add a newline to separate content from different files
+                    yield from infile
+                    yield "\n"  # Add a newline to separate content from different files
                 print(f"Merged: {file_path}")
             except UnicodeDecodeError:
                 print(f"Skipped file (likely binary): {file_path}")
             except FileNotFoundError:
                 print(f"File not found: {file_path}")
+        for source in sources:
+            for domain in source:
+                yield domain + "\n"
+
+    # Merge the contents of the files, streaming line by line
+    with open(output_filename, "w", encoding="utf-8") as outfile:
+        if dedup:
+            outfile.writelines(domain + "\n" for domain in iter_unique(iter_lines()))
+        else:
+            outfile.writelines(iter_lines())
 
     print(f"Successfully merged files into: {output_filename}")
 
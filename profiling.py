@@ -0,0 +1,169 @@
+"""
+Opt-in profiling for the scanner hot path.
+
+When enabled, one in `sample_every` queries is timed per stage, and the
+event loop lag is measured:
+
+    wait      waiting for a concurrency slot
+    resolve   sending the query and waiting for c-ares (aiodns gives no
+              hook between the two, so send is not a stage of its own);
+              in differential mode also waiting for a slower control query
+    retry     retry_delay sleeps after timeouts, kept out of resolve
+    answers   turning the c-ares reply into a list of addresses
+    classify  matching answers against the target addresses
+    results   the --results record
+    compare   differential comparison with the control answer
+    record    match set insert and counters
+    print     the [Found] line
+    file      rewriting the output file
+
+Loop scheduling delay shows up as loop lag. Signals:
+
+    SIGUSR1  print stage timings and loop lag (plus a tracemalloc top list
+             and snapshot file when --tracemalloc is on)
+    SIGUSR2  start / stop cProfile, dumping stats to the --cprofile file
+
+When profiling is off the scanner passes profiler=None and the hot path only
+pays for an `if profiler` check.
+"""
+
+import asyncio
+import collections
+import cProfile
+import signal
+import time
+import tracemalloc
+
+STAGES = ("wait", "resolve", "retry", "answers", "classify", "results", "compare", "record", "print", "file")
+
+
+class StageStats:
+    def __init__(self, keep: int = 10000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=keep)
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.samples.append(elapsed)
+
+    def percentile(self, p: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def summary(self, name: str) -> str:
+        mean = self.total / self.count if self.count else 0.0
+        return (
+            f"{name:<10}{self.count:>10}{mean * 1000:>10.3f}{self.percentile(0.5) * 1000:>10.3f}"
+            f"{self.percentile(0.99) * 1000:>10.3f}{self.max * 1000:>10.3f}"
+        )
+
+
+class Probe:
+    """
+    Timer for one sampled query. mark() closes the current stage; time spent
+    in a stage is summed over its marks (several record types may resolve
+    concurrently) and finish() records one sample per stage reached.
+    """
+
+    __slots__ = ("profiler", "last", "times")
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.last = time.perf_counter()
+        self.times = {}
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.times[stage] = self.times.get(stage, 0.0) + max(0.0, now - self.last)
+        self.last = now
+
+    def exclude(self, stage: str, elapsed: float):
+        """Book `elapsed` seconds, just spent, to `stage` instead of the current one."""
+        self.times[stage] = self.times.get(stage, 0.0) + elapsed
+        self.last += elapsed
+
+    def finish(self):
+        stages = self.profiler.stages
+        for stage, elapsed in self.times.items():
+            stages[stage].add(elapsed)
+
+
+class Profiler:
+    def __init__(self, sample_every: int = 100, cprofile_file: str = None, use_tracemalloc: bool = False):
+        self.sample_every = max(1, sample_every)
+        self.cprofile_file = cprofile_file
+        self.use_tracemalloc = use_tracemalloc
+        self.stages = {stage: StageStats() for stage in STAGES}
+        self.loop_lag = StageStats()
+        self._counter = 0
+        self._cprofile = None
+        self._lag_task = None
+
+    def probe(self):
+        """Return a Probe for every `sample_every`-th query, else None."""
+        self._counter += 1
+        if self._counter % self.sample_every:
+            return None
+        return Probe(self)
+
+    async def _measure_loop_lag(self, interval: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.add(max(0.0, loop.time() - expected))
+
+    def start(self, lag_interval: float = 0.1):
+        """Start loop lag measurement and install the signal handlers."""
+        loop = asyncio.get_running_loop()
+        self._lag_task = asyncio.create_task(self._measure_loop_lag(lag_interval))
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        loop.add_signal_handler(signal.SIGUSR1, self.dump)
+        if self.cprofile_file:
+            loop.add_signal_handler(signal.SIGUSR2, self.toggle_cprofile)
+        print(f"[Profile] Sampling 1/{self.sample_every} queries; SIGUSR1 dumps stats"
+              + ("; SIGUSR2 toggles cProfile" if self.cprofile_file else ""))
+
+    def stop(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+        if self._cprofile:
+            self.toggle_cprofile()
+        loop = asyncio.get_running_loop()
+        loop.remove_signal_handler(signal.SIGUSR1)
+        if self.cprofile_file:
+            loop.remove_signal_handler(signal.SIGUSR2)
+        self.dump()
+
+    def toggle_cprofile(self):
+        if self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            print("[Profile] cProfile started")
+        else:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_file)
+            self._cprofile = None
+            print(f"[Profile] cProfile stats written to {self.cprofile_file}")
+
+    def dump(self):
+        lines = [f"{'stage':<10}{'count':>10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for stage in STAGES:
+            lines.append(self.stages[stage].summary(stage))
+        lines.append(self.loop_lag.summary("loop lag"))
+        print("[Profile]\n" + "\n".join(lines))
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            path = f"tracemalloc-{int(time.time())}.snap"
+            snapshot.dump(path)
+            print(f"[Profile] tracemalloc snapshot written to {path}, top allocations:")
+            for stat in snapshot.statistics("lineno")[:10]:
+                print(f"  {stat}")
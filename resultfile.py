@@ -0,0 +1,370 @@
+"""
+Compact binary scan results.
+
+A result file is a compressed stream (gzip, or zstd when the `zstandard`
+package is installed and the file name ends in .zst) of
+
+    magic | (magic | block)*
+
+Records are buffered and written in blocks of up to BLOCK_RECORDS, stored
+column by column so a whole block decodes with a handful of bulk
+operations instead of one struct call per record:
+
+    header: records, names length, IPv4 answers, IPv6 answers (u32 each)
+    names:  domains joined by "\n"
+    status, resolver id:  one byte per record
+    timestamp:            u32 per record
+    IPv4, IPv6 counts:    one byte per record each (up to 255 answers)
+    IPv4 answers:         4 byte addresses, in record order
+    IPv6 answers:         16 byte addresses, in record order
+
+All integers are little endian. Addresses are stored packed and read back
+as packed bytes; fixed-width address columns can be searched for target
+addresses directly (see ResultBlock.matching). Use ipaddress.ip_address()
+on them when text is needed.
+"""
+
+import argparse
+import bisect
+import functools
+import gzip
+import ipaddress
+import itertools
+import operator
+import socket
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+MAGIC = b"RPZRES2\n"
+MAGIC_PREFIX = b"RPZRES"
+BLOCK_HEADER = struct.Struct("<IIII")
+BLOCK_RECORDS = 16384
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+STATUSES = ("ok", "found", "nxdomain", "timeout", "error")
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+ScanResult = namedtuple("ScanResult", "domain status resolver ips timestamp")
+# builds ScanResults from zipped columns without a Python call per record
+_make_result = functools.partial(tuple.__new__, ScanResult)
+
+
+def _open_compressed(path: str, mode: str):
+    if mode == "rb":
+        with open(path, "rb") as f:
+            head = f.read(4)
+        if head.startswith(GZIP_MAGIC):
+            return gzip.open(path, "rb")
+        if head == ZSTD_MAGIC:
+            if zstandard is None:
+                raise RuntimeError(f"{path} is zstd compressed, install zstandard to read it")
+            # appended sessions are separate frames, see ResultWriter
+            return zstandard.ZstdDecompressor().stream_reader(
+                open(path, "rb"), read_across_frames=True, closefd=True
+            )
+        return open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("install zstandard to write .zst result files")
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, mode), closefd=True)
+    return gzip.open(path, mode, compresslevel=6)
+
+
+def _pack(ip) -> bytes:
+    if isinstance(ip, bytes):
+        return ip
+    if isinstance(ip, str):
+        return socket.inet_pton(socket.AF_INET6 if ":" in ip else socket.AF_INET, ip)
+    return ip.packed
+
+
+def _u32(values) -> bytes:
+    column = array("I", values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _u32_array(data) -> array:
+    column = array("I")
+    column.frombytes(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+class ResultWriter:
+    """
+    Append-only writer for scan results.
+
+    Usage:
+        with ResultWriter("results.rpzr.gz") as writer:
+            writer.write("example.com", "found", resolver=1, ips=["182.173.0.181"])
+
+    Records are written in blocks; up to BLOCK_RECORDS records are held in
+    memory until the next block or close().
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self._file = _open_compressed(path, "ab" if append else "wb")
+        # gzip and zstd both allow concatenated frames, so every appended
+        # frame starts with its own magic
+        self._file.write(MAGIC)
+        self.count = 0
+        self._reset()
+
+    def _reset(self):
+        self._names = []
+        self._statuses = bytearray()
+        self._resolvers = bytearray()
+        self._timestamps = []
+        self._v4_counts = bytearray()
+        self._v4 = []
+        self._v6_counts = bytearray()
+        self._v6 = []
+
+    def write(self, domain: str, status: str, resolver: int = 0, ips=(), timestamp: float = None):
+        self._names.append(domain.rstrip(".").encode("ascii", "ignore"))
+        self._statuses.append(STATUS_CODES[status])
+        self._resolvers.append(resolver & 0xFF)
+        self._timestamps.append(int(time.time() if timestamp is None else timestamp))
+        v4 = v6 = 0
+        for ip in ips:
+            address = _pack(ip)
+            if len(address) == 4:
+                if v4 < 255:
+                    self._v4.append(address)
+                    v4 += 1
+            elif v6 < 255:
+                self._v6.append(address)
+                v6 += 1
+        self._v4_counts.append(v4)
+        self._v6_counts.append(v6)
+        self.count += 1
+        if len(self._names) >= BLOCK_RECORDS:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records as one block."""
+        if not self._names:
+            return
+        names = b"\n".join(self._names)
+        self._file.write(
+            b"".join((
+                BLOCK_HEADER.pack(len(self._names), len(names), len(self._v4), len(self._v6)),
+                names,
+                bytes(self._statuses),
+                bytes(self._resolvers),
+                _u32(self._timestamps),
+                bytes(self._v4_counts),
+                bytes(self._v6_counts),
+                b"".join(self._v4),
+                b"".join(self._v6),
+            ))
+        )
+        self._reset()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultBlock:
+    """One decoded block: parallel columns for up to BLOCK_RECORDS records."""
+
+    __slots__ = ("names", "statuses", "resolvers", "timestamps", "v4_counts", "v6_counts", "v4", "v6", "_domains")
+
+    def __init__(self, names, statuses, resolvers, timestamps, v4_counts, v6_counts, v4, v6):
+        self.names = names
+        self.statuses = statuses
+        self.resolvers = resolvers
+        self.timestamps = timestamps
+        self.v4_counts = v4_counts
+        self.v6_counts = v6_counts
+        self.v4 = v4
+        self.v6 = v6
+        self._domains = None
+
+    @property
+    def domains(self):
+        if self._domains is None:
+            self._domains = self.names.decode("ascii").split("\n")
+        return self._domains
+
+    def matching(self, targets) -> set:
+        """Domains with at least one answer in `targets` (an ipmatch.TargetSet)."""
+        found = set()
+        for counts, column, width in ((self.v4_counts, self.v4, 4), (self.v6_counts, self.v6, 16)):
+            hits = list(targets.find_packed(column, width)) if column else ()
+            if hits:
+                # answer index -> record index
+                ends = list(itertools.accumulate(counts))
+                domains = self.domains
+                found.update(domains[bisect.bisect_right(ends, i)] for i in hits)
+        return found
+
+    def __iter__(self):
+        ips = _split_answers(self.v4, 4, self.v4_counts)
+        if self.v6:
+            ips = list(map(operator.add, ips, _split_answers(self.v6, 16, self.v6_counts)))
+        return map(
+            _make_result,
+            zip(
+                self.domains,
+                map(STATUSES.__getitem__, self.statuses),
+                self.resolvers,
+                ips,
+                self.timestamps,
+            ),
+        )
+
+
+def _split_answers(column: bytes, width: int, counts) -> list:
+    """Split an address column into one list of answers per record."""
+    answers = iter([column[i : i + width] for i in range(0, len(column), width)])
+    islice = itertools.islice
+    return [list(islice(answers, count)) for count in counts]
+
+
+def _read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    # zstd readers may return short reads
+    while len(data) < size:
+        more = f.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def read_blocks(path: str):
+    """Yield ResultBlock objects from a result file."""
+    header_size = BLOCK_HEADER.size
+    with _open_compressed(path, "rb") as f:
+        head = _read_exact(f, len(MAGIC))
+        if head != MAGIC:
+            if head.startswith(MAGIC_PREFIX):
+                raise ValueError(f"{path}: unsupported result file version {head[len(MAGIC_PREFIX):].strip()!r}")
+            raise ValueError(f"{path}: not a result file")
+        while True:
+            head = _read_exact(f, len(MAGIC))
+            if not head:
+                break
+            if head == MAGIC:
+                # start of an appended session
+                continue
+            head += _read_exact(f, header_size - len(head))
+            if len(head) < header_size:
+                raise ValueError(f"{path}: truncated block at end of file")
+            records, names_len, v4_count, v6_count = BLOCK_HEADER.unpack(head)
+            size = names_len + records * 8 + v4_count * 4 + v6_count * 16
+            data = _read_exact(f, size)
+            if len(data) < size:
+                raise ValueError(f"{path}: truncated block at end of file")
+            view = memoryview(data)
+            pos = names_len
+            statuses = data[pos : pos + records]
+            pos += records
+            resolvers = data[pos : pos + records]
+            pos += records
+            timestamps = _u32_array(view[pos : pos + records * 4])
+            pos += records * 4
+            v4_counts = data[pos : pos + records]
+            pos += records
+            v6_counts = data[pos : pos + records]
+            pos += records
+            v4 = data[pos : pos + v4_count * 4]
+            pos += v4_count * 4
+            v6 = data[pos : pos + v6_count * 16]
+            yield ResultBlock(data[:names_len], statuses, resolvers, timestamps, v4_counts, v6_counts, v4, v6)
+
+
+def read_results(path: str):
+    """Iterate over the ScanResult records of a result file."""
+    return itertools.chain.from_iterable(read_blocks(path))
+
+
+def is_result_file(path: str) -> bool:
+    """True if `path` is a binary result file rather than text."""
+    try:
+        with _open_compressed(path, "rb") as f:
+            return f.read(len(MAGIC)).startswith(MAGIC_PREFIX)
+    except (OSError, RuntimeError):
+        return False
+
+
+def iter_massdns(lines):
+    """
+    Turn massdns simple-format output ("example.com. A 1.2.3.4") into
+    (domain, ips) pairs; consecutive lines for one name are merged.
+    """
+    current = None
+    ips = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3:
+            continue
+        domain = parts[0].rstrip(".")
+        if domain != current:
+            if current is not None:
+                yield current, ips
+            current, ips = domain, []
+        if parts[1] == "A" or parts[1] == "AAAA":
+            try:
+                ips.append(socket.inet_pton(socket.AF_INET if parts[1] == "A" else socket.AF_INET6, parts[2]))
+            except OSError:
+                pass
+    if current is not None:
+        yield current, ips
+
+
+def main():
+    p = argparse.ArgumentParser(description="Convert and inspect binary scan result files")
+    sub = p.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convert massdns -o S output to a result file")
+    convert.add_argument("input", help="massdns results (e.g. results.txt)")
+    convert.add_argument("output", help="result file (.gz, or .zst with zstandard)")
+    dump = sub.add_parser("dump", help="print a result file as text")
+    dump.add_argument("input")
+    stats = sub.add_parser("stats", help="count records per status")
+    stats.add_argument("input")
+    args = p.parse_args()
+
+    if args.command == "convert":
+        with open(args.input, "r", encoding="utf-8", errors="ignore") as f, ResultWriter(args.output) as writer:
+            for domain, ips in iter_massdns(f):
+                writer.write(domain, "ok", ips=ips)
+        print(f"Converted {writer.count} domains into {args.output}")
+    elif args.command == "stats":
+        counts = dict.fromkeys(STATUSES, 0)
+        answers = 0
+        for result in read_results(args.input):
+            counts[result.status] += 1
+            answers += len(result.ips)
+        print(f"{sum(counts.values())} records, {answers} answers")
+        for status, count in counts.items():
+            print(f"  {status:<10}{count:>12}")
+    else:
+        for result in read_results(args.input):
+            ips = ",".join(str(ipaddress.ip_address(ip)) for ip in result.ips)
+            print(f"{result.domain} {result.status} {result.resolver} {result.timestamp} {ips}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,16 +9,25 @@ Usage: python remove_processed_domains.py
 import os
 from collections import defaultdict
 
+from resultfile import is_result_file, read_blocks
+
 def extract_processed_domains(results_file):
     """
     Extract processed domains from massdns results file.
     Returns a set of processed domain names.
+    Binary result files (resultfile.py) are read without text parsing.
     """
     processed_domains = set()
     
     print(f"reading file from {results_file}...")
     
     try:
+        if is_result_file(results_file):
+            for block in read_blocks(results_file):
+                processed_domains.update(block.domains)
+            print(f"done found {len(processed_domains):,} domains")
+            return processed_domains
+
         with open(results_file, 'r', encoding='utf-8') as f:
             line_count = 0
             for line in f:
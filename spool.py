@@ -0,0 +1,67 @@
+import os
+import shutil
+import time
+
+from merge_datas import open_text
+
+SPOOL_SUFFIXES = (".txt", ".gz")
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+
+
+class SpoolFile:
+    """A spool file being scanned; archived once every domain is processed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending = 0
+        self.read_done = False
+        self.failed = False
+
+    def finished(self) -> bool:
+        return self.read_done and self.pending == 0 and not self.failed
+
+
+def find_new_files(spool_dir: str, seen, settle: float = 5.0):
+    """
+    Return spool files not seen yet, oldest first. Files modified in the
+    last `settle` seconds are left alone since they may still be written.
+    """
+    now = time.time()
+    found = []
+    with os.scandir(spool_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(SPOOL_SUFFIXES):
+                continue
+            if entry.path in seen:
+                continue
+            mtime = entry.stat().st_mtime
+            if now - mtime < settle:
+                continue
+            found.append((mtime, entry.path))
+    return [path for _, path in sorted(found)]
+
+
+def iter_file_domains(path: str):
+    """Yield domains from a plain or gzip compressed list, one per line."""
+    with open_text(path) as f:
+        for line in f:
+            domain = line.strip().lower().rstrip(".")
+            if domain and not domain.startswith("#"):
+                yield domain
+
+
+def archive(path: str, spool_dir: str, subdir: str = DONE_DIR) -> str:
+    """Move a spool file into spool_dir/done/ (or another subdirectory)."""
+    done_dir = os.path.join(spool_dir, subdir)
+    os.makedirs(done_dir, exist_ok=True)
+    target = os.path.join(done_dir, os.path.basename(path))
+    # producers may reuse file names, never overwrite an earlier drop
+    root, ext = os.path.splitext(target)
+    stamp = int(time.time())
+    n = 0
+    while os.path.exists(target):
+        n += 1
+        target = f"{root}.{stamp}-{n}{ext}"
+    shutil.move(path, target)
+    return target
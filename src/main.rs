@@ -7,14 +7,14 @@ use async_std::{
 use fasthash::city;
 use futures::future::join_all;
 use std::{
-    collections::HashSet,
+    collections::{HashMap, HashSet},
     hash::Hasher,
     net::IpAddr,
     time::{Duration, Instant},
 };
 use hickory_resolver::{
-    config::{NameServerConfig, Protocol, ResolverConfig, ResolverOpts},
-    error::ResolveError,
+    config::{LookupIpStrategy, NameServerConfig, Protocol, ResolverConfig, ResolverOpts},
+    error::ResolveErrorKind,
     AsyncResolver,
     TokioAsyncResolver,
     lookup_ip::LookupIpIter,
@@ -33,12 +33,104 @@ const DNS_SERVERS: &[&str] = &[
     "203.133.1.6",
     "210.243.121.155",
 ];
+// single addresses or CIDR ranges ("182.173.0.0/24")
 const TARGET_IPS: &[&str] = &["182.173.0.181"];
 const RETRY_DELAY: Duration = Duration::from_millis(500);
 const MAX_RETRIES: u32 = 2;
 const NUM_TASKS: usize = 50;
 const WRITE_THRESHOLD: usize = 100;
 const RESOLVER_TIMEOUT: u64 = 5;
+// comma separated "ip" or "ip:port" list overriding DNS_SERVERS (e.g. a local stub)
+const DNS_SERVERS_ENV: &str = "RPZ_DNS_SERVERS";
+// comma separated list overriding TARGET_IPS
+const TARGET_IPS_ENV: &str = "RPZ_TARGET_IPS";
+// record types to query: "A" (default, like main.py), "AAAA" or "A,AAAA";
+// with both, the A and AAAA queries go to the same resolver concurrently and
+// are merged
+const QTYPES_ENV: &str = "RPZ_QTYPES";
+
+/// Target networks compiled into one set of network numbers per prefix
+/// length, so matching an answer is a shift and a hash lookup per length
+/// instead of formatting the address and comparing strings.
+struct TargetSet {
+    v4: Vec<(u32, HashSet<u32>)>,
+    v6: Vec<(u32, HashSet<u128>)>,
+}
+
+impl TargetSet {
+    fn parse(targets: &[String]) -> Result<Self, String> {
+        let mut v4: HashMap<u32, HashSet<u32>> = HashMap::new();
+        let mut v6: HashMap<u32, HashSet<u128>> = HashMap::new();
+        for target in targets {
+            let (addr, prefix_len) = match target.split_once('/') {
+                Some((addr, len)) => (
+                    addr,
+                    Some(len.parse::<u32>().map_err(|e| {
+                        format!("Invalid prefix length in target {}: {}", target, e)
+                    })?),
+                ),
+                None => (target.as_str(), None),
+            };
+            let addr: IpAddr = addr
+                .parse()
+                .map_err(|e| format!("Invalid target address {}: {}", target, e))?;
+            match addr {
+                IpAddr::V4(addr) => {
+                    let len = prefix_len.unwrap_or(32).min(32);
+                    let network = u32::from(addr).checked_shr(32 - len).unwrap_or(0);
+                    v4.entry(len).or_default().insert(network);
+                }
+                IpAddr::V6(addr) => {
+                    let len = prefix_len.unwrap_or(128).min(128);
+                    let network = u128::from(addr).checked_shr(128 - len).unwrap_or(0);
+                    v6.entry(len).or_default().insert(network);
+                }
+            }
+        }
+        Ok(TargetSet {
+            v4: v4.into_iter().collect(),
+            v6: v6.into_iter().collect(),
+        })
+    }
+
+    fn contains(&self, ip: &IpAddr) -> bool {
+        match ip {
+            IpAddr::V4(addr) => {
+                let value = u32::from(*addr);
+                self.v4
+                    .iter()
+                    .any(|(len, set)| set.contains(&value.checked_shr(32 - len).unwrap_or(0)))
+            }
+            IpAddr::V6(addr) => {
+                let value = u128::from(*addr);
+                self.v6
+                    .iter()
+                    .any(|(len, set)| set.contains(&value.checked_shr(128 - len).unwrap_or(0)))
+            }
+        }
+    }
+}
+
+fn ip_strategy() -> LookupIpStrategy {
+    let qtypes = std::env::var(QTYPES_ENV).unwrap_or_default().to_uppercase();
+    let qtypes: HashSet<&str> = qtypes.split(',').map(|s| s.trim()).collect();
+    match (qtypes.contains("A"), qtypes.contains("AAAA")) {
+        (true, true) => LookupIpStrategy::Ipv4AndIpv6,
+        (false, true) => LookupIpStrategy::Ipv6Only,
+        _ => LookupIpStrategy::Ipv4Only,
+    }
+}
+
+fn target_ips() -> Vec<String> {
+    match std::env::var(TARGET_IPS_ENV) {
+        Ok(targets) if !targets.trim().is_empty() => targets
+            .split(',')
+            .map(|s| s.trim().to_string())
+            .filter(|s| !s.is_empty())
+            .collect(),
+        _ => TARGET_IPS.iter().map(|s| s.to_string()).collect(),
+    }
+}
 
 #[async_std::main]
 async fn main() -> Result<(), Box<dyn std::error::Error>> {
@@ -48,7 +140,8 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
     let domains = read_domains(&input_file).await?;
     let num_domains = domains.len();
 
-    let resolvers = create_resolvers().await?;
+    let resolvers = Arc::new(create_resolvers().await?);
+    let targets = Arc::new(TargetSet::parse(&target_ips())?);
     let resolver_timeouts = Arc::new(
         resolvers
             .iter()
@@ -75,12 +168,22 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
         }
     });
 
+    // domains currently being queried; a repeat of one of them is skipped
+    // instead of querying it twice at the same time
+    let inflight = Arc::new(Mutex::new(HashSet::new()));
+
     let mut tasks = Vec::new();
     for domain in domains {
+        if !inflight.lock().await.insert(domain.clone()) {
+            continue;
+        }
+        let inflight = Arc::clone(&inflight);
         let resolvers = Arc::clone(&resolvers);
         let resolver_timeouts = Arc::clone(&resolver_timeouts);
         let matching_domains = Arc::clone(&matching_domains);
         let processed_count = Arc::clone(&processed_count);
+        let output_file = output_file.clone();
+        let targets = Arc::clone(&targets);
 
         let task = task::spawn(async move {
             let resolver_index = {
@@ -95,8 +198,7 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
                 match resolver.lookup_ip(domain.as_str()).await {
                     Ok(response) => {
                         for ip in response {
-                            let ip_str = ip.to_string();
-                            if TARGET_IPS.contains(&ip_str.as_str()) {
+                            if targets.contains(&ip) {
                                 let mut locked_matching_domains = matching_domains.lock().await;
                                 locked_matching_domains.insert(domain.clone());
                                 let matching_count = locked_matching_domains.len();
@@ -110,7 +212,7 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
 
                                 println!(
                                     "Domain: {}, IP: {}, Matching: {}, Processed: {}, Rate: {:.2}/sec",
-                                    domain, ip_str, matching_count, processed, rate
+                                    domain, ip, matching_count, processed, rate
                                 );
 
                                 if matching_count >= WRITE_THRESHOLD {
@@ -124,13 +226,12 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
                         }
                         break;
                     }
-                    Err(err) => match err {
-                            
-                        ResolveError::NoRecordsFound { .. } => {
+                    Err(err) => match err.kind() {
+                        ResolveErrorKind::NoRecordsFound { .. } => {
                             println!("Domain {} does not exist (NXDOMAIN or NoRecordsFound)", domain);
                             break;
                         },
-                        ResolveError::Timeout { .. }=> {
+                        ResolveErrorKind::Timeout => {
                             let mut locked_timeout = resolver_timeout.lock().await;
                             *locked_timeout += 1;
                             println!(
@@ -147,6 +248,7 @@ async fn main() -> Result<(), Box<dyn std::error::Error>> {
                 }
             }
 
+            inflight.lock().await.remove(&domain);
             let mut locked_processed_count = processed_count.lock().await;
             *locked_processed_count += 1;
         });
@@ -217,10 +319,26 @@ async fn write_domains(filename: &str, domains: &[String]) -> Result<(), std::io
     Ok(())
 }
 
+fn dns_servers() -> Vec<String> {
+    match std::env::var(DNS_SERVERS_ENV) {
+        Ok(servers) if !servers.trim().is_empty() => servers
+            .split(',')
+            .map(|s| s.trim().to_string())
+            .filter(|s| !s.is_empty())
+            .collect(),
+        _ => DNS_SERVERS.iter().map(|s| s.to_string()).collect(),
+    }
+}
+
 async fn create_resolvers() -> Result<Vec<TokioAsyncResolver>, std::io::Error> {
     let mut resolvers = Vec::new();
-    for &server in DNS_SERVERS {
-        let socket_addr = format!("{}:53", server).parse().map_err(|e| {
+    for server in dns_servers() {
+        let address = if server.contains(':') {
+            server.clone()
+        } else {
+            format!("{}:53", server)
+        };
+        let socket_addr = address.parse().map_err(|e| {
             std::io::Error::new(
                 std::io::ErrorKind::Other,
                 format!("Invalid DNS server address: {}", e),
@@ -239,6 +357,7 @@ async fn create_resolvers() -> Result<Vec<TokioAsyncResolver>, std::io::Error> {
         let mut resolver_opts = ResolverOpts::default();
         resolver_opts.timeout = Duration::from_secs(RESOLVER_TIMEOUT);
         resolver_opts.num_concurrent_reqs = 0;
+        resolver_opts.ip_strategy = ip_strategy();
         let resolver = TokioAsyncResolver::tokio(resolver_config, resolver_opts).map_err(|e| {
             std::io::Error::new(
                 std::io::ErrorKind::Other,
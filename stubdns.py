@@ -0,0 +1,208 @@
+"""
+Local stub DNS server for benchmarks and testing.
+
+Answers every A query on UDP with a deterministic address, except for a
+seeded subset of names that get the RPZ landing address, so a scan against it
+has a known expected result. Latency, jitter, packet loss and NXDOMAIN rate are
+configurable; per-domain statistics are written as JSON on shutdown.
+
+    python stubdns.py --port 5353 --latency 0.02 --loss 0.01 --rpz-rate 0.01
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import random
+import signal
+import struct
+import time
+import zlib
+
+RPZ_IP = "182.173.0.181"
+TYPE_A = 1
+TYPE_AAAA = 28
+RCODE_NXDOMAIN = 3
+
+
+def _fraction(key: str) -> float:
+    return zlib.crc32(key.encode()) / 2**32
+
+
+def is_rpz(domain: str, seed: int, rate: float) -> bool:
+    """True if the stub answers `domain` with the RPZ address."""
+    return _fraction(f"rpz:{seed}:{domain}") < rate
+
+
+def is_nxdomain(domain: str, seed: int, rate: float) -> bool:
+    return _fraction(f"nx:{seed}:{domain}") < rate
+
+
+def parse_query(data: bytes):
+    """Return (id, flags, qname, qtype, question bytes) or None."""
+    if len(data) < 12:
+        return None
+    qid, flags, qdcount = struct.unpack_from("!HHH", data)
+    if qdcount != 1:
+        return None
+    pos = 12
+    labels = []
+    while pos < len(data):
+        length = data[pos]
+        pos += 1
+        if length == 0:
+            break
+        if length & 0xC0:
+            return None
+        labels.append(data[pos : pos + length])
+        pos += length
+    if pos + 4 > len(data):
+        return None
+    qtype = struct.unpack_from("!H", data, pos)[0]
+    pos += 4
+    qname = b".".join(labels).decode("ascii", "ignore").lower()
+    return qid, flags, qname, qtype, data[12:pos]
+
+
+class StubResolver(asyncio.DatagramProtocol):
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, rpz_rate=0.01, nxdomain_rate=0.0,
+                 seed=1, ttl=300, rpz_ip=RPZ_IP):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rpz_rate = rpz_rate
+        self.nxdomain_rate = nxdomain_rate
+        self.seed = seed
+        self.ttl = ttl
+        self.rpz_ip = ipaddress.ip_address(rpz_ip).packed
+        self.random = random.Random(seed)
+        self.transport = None
+        self.received = 0
+        self.dropped = 0
+        self.answered = 0
+        self.first_seen = {}
+        self.latencies = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def answer(self, qname: str, qtype: int):
+        """Return (rcode, rtype, rdata) for a question."""
+        if is_nxdomain(qname, self.seed, self.nxdomain_rate):
+            return RCODE_NXDOMAIN, None, None
+        h = zlib.crc32(f"ip:{self.seed}:{qname}".encode())
+        if qtype == TYPE_A:
+            if is_rpz(qname, self.seed, self.rpz_rate):
+                return 0, TYPE_A, self.rpz_ip
+            # 198.18.0.0/15 is reserved for benchmarking
+            return 0, TYPE_A, bytes((198, 18 + (h & 1), (h >> 8) & 0xFF, (h >> 16) & 0xFF))
+        if qtype == TYPE_AAAA:
+            return 0, TYPE_AAAA, ipaddress.ip_address(f"2001:db8::{h & 0xFFFF:x}:{h >> 16:x}").packed
+        return 0, None, None
+
+    def build_response(self, qid, flags, qname, qtype, question) -> bytes:
+        rcode, rtype, rdata = self.answer(qname, qtype)
+        # QR, copy RD, RA
+        out_flags = 0x8080 | (flags & 0x0100) | rcode
+        ancount = 1 if rdata else 0
+        parts = [struct.pack("!HHHHHH", qid, out_flags, 1, ancount, 0, 0), question]
+        if rdata:
+            parts.append(struct.pack("!HHHIH", 0xC00C, rtype, 1, self.ttl, len(rdata)))
+            parts.append(rdata)
+        return b"".join(parts)
+
+    def datagram_received(self, data, addr):
+        query = parse_query(data)
+        if query is None:
+            return
+        self.received += 1
+        now = time.monotonic()
+        qname = query[2]
+        self.first_seen.setdefault(qname, now)
+        if self.loss and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        response = self.build_response(*query)
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._send, response, addr, qname)
+        else:
+            self._send(response, addr, qname)
+
+    def _send(self, response, addr, qname):
+        self.transport.sendto(response, addr)
+        self.answered += 1
+        self.latencies.append(time.monotonic() - self.first_seen[qname])
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            "received": self.received,
+            "answered": self.answered,
+            "dropped": self.dropped,
+            "domains": len(self.first_seen),
+            "latency_p50": percentile(0.50),
+            "latency_p99": percentile(0.99),
+        }
+
+
+async def serve(host, port, stats_file=None, **options):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: StubResolver(**options), local_addr=(host, port)
+    )
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"[Info] Stub DNS listening on {host}:{transport.get_extra_info('sockname')[1]}", flush=True)
+    try:
+        await stop.wait()
+    finally:
+        transport.close()
+        stats = protocol.stats()
+        print(f"[Info] Stub DNS stats: {stats}", flush=True)
+        if stats_file:
+            with open(stats_file, "w") as f:
+                json.dump(stats, f)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Local stub DNS server with RPZ-style redirects")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=5353)
+    p.add_argument("--latency", type=float, default=0.0, help="base response delay in seconds")
+    p.add_argument("--jitter", type=float, default=0.0, help="extra random delay up to this many seconds")
+    p.add_argument("--loss", type=float, default=0.0, help="fraction of queries dropped")
+    p.add_argument("--rpz-rate", type=float, default=0.01, help=f"fraction of names answered with {RPZ_IP}")
+    p.add_argument("--rpz-ip", default=RPZ_IP, help="address returned for redirected names")
+    p.add_argument("--nxdomain-rate", type=float, default=0.0, help="fraction of names answered NXDOMAIN")
+    p.add_argument("--ttl", type=int, default=300)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--stats", default=None, help="write JSON statistics here on shutdown")
+    args = p.parse_args()
+
+    asyncio.run(
+        serve(
+            args.host,
+            args.port,
+            stats_file=args.stats,
+            latency=args.latency,
+            jitter=args.jitter,
+            loss=args.loss,
+            rpz_rate=args.rpz_rate,
+            nxdomain_rate=args.nxdomain_rate,
+            seed=args.seed,
+            ttl=args.ttl,
+            rpz_ip=args.rpz_ip,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()